@@ -0,0 +1,270 @@
+import ast
+import numpy as np
+from code_graph import parse_code, analyze_tree
+from graph_core import CodeGraph, EDGE_KINDS, TYPE_CODES
+from trace_analysis import transition_counts
+
+EDGE_CODES = {name: code for code, name in enumerate(EDGE_KINDS)}
+# Edges that hand control to another block; a block with one of these is finished
+CONTROL_EDGES = frozenset(('flow', 'branch', 'loop', 'jump'))
+LOOP_TYPES = (ast.For, ast.AsyncFor, ast.While)
+WITH_TYPES = (ast.With, ast.AsyncWith)
+FUNCTION_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef)
+TRY_TYPES = (ast.Try, ast.TryStar) if hasattr(ast, 'TryStar') else (ast.Try,)
+
+# --- Basic-Block Control-Flow Graph ---
+class CFGBuilder:
+    """Groups straight-line statements into basic blocks joined by control-flow edges.
+
+    Statements are walked with a list of pending exits, (block, edge kind) pairs
+    that flow into whatever comes next. A statement joins the current block only
+    when there is exactly one plain fall-through exit into an unfinished block;
+    otherwise it starts a new block linked from every pending exit.
+    """
+
+    def __init__(self):
+        self.ranges = []
+        self.edges = []
+        self.finished = set()
+        # (header block, break exits) for each enclosing loop
+        self.loops = []
+        # Blocks created inside each enclosing try body, which may raise into its handlers
+        self.try_blocks = []
+        # (loop depth, pending jumps) for each enclosing try with a finally block; breaks,
+        # continues and returns inside it run the finally block before going on
+        self.finally_frames = []
+
+    def new_block(self):
+        self.ranges.append([])
+        block = len(self.ranges) - 1
+        if self.try_blocks:
+            self.try_blocks[-1].append(block)
+        return block
+
+    def link(self, source, target, kind):
+        self.edges.append((source, target, EDGE_CODES[kind]))
+        if kind in CONTROL_EDGES:
+            self.finished.add(source)
+
+    def block_for(self, exits):
+        if len(exits) == 1 and exits[0][1] == 'flow' and exits[0][0] not in self.finished:
+            return exits[0][0]
+        # Code after a return/break/raise gets a block with no way in
+        block = self.new_block()
+        for source, kind in exits:
+            self.link(source, block, kind)
+        return block
+
+    def add_lines(self, block, first, last):
+        ranges = self.ranges[block]
+        if ranges and ranges[-1][1] + 1 >= first:
+            ranges[-1][1] = max(ranges[-1][1], last)
+        else:
+            ranges.append([first, last])
+
+    def add_header(self, block, node, body_line):
+        # Decorators and a multi-line condition or signature belong to the header
+        first = min([d.lineno for d in getattr(node, 'decorator_list', [])] + [node.lineno])
+        self.add_lines(block, first, max(node.lineno, body_line - 1))
+
+    def jump(self, block, target):
+        """Sends a 'break', 'continue' or 'return' from `block` on to where it goes."""
+        frame = self.finally_frames[-1] if self.finally_frames else None
+        if frame is not None and (target == 'return' or frame[0] >= len(self.loops)):
+            frame[1].append((block, target))
+        elif target == 'break' and self.loops:
+            self.loops[-1][1].append(block)
+        elif target == 'continue' and self.loops:
+            self.link(block, self.loops[-1][0], 'jump')
+
+    def body(self, statements, exits):
+        for node in statements:
+            exits = self.statement(node, exits)
+        return exits
+
+    def statement(self, node, exits):
+        if isinstance(node, ast.If):
+            block = self.block_for(exits)
+            self.add_header(block, node, node.body[0].lineno)
+            after = self.body(node.body, [(block, 'branch')])
+            return after + self.body(node.orelse, [(block, 'branch')])
+
+        if isinstance(node, LOOP_TYPES):
+            # The header gets its own block so the back edge has somewhere to land;
+            # an empty block just opened (e.g. a try body) can serve as one
+            if len(exits) == 1 and exits[0][1] == 'flow' and not self.ranges[exits[0][0]] \
+                    and exits[0][0] not in self.finished:
+                header = exits[0][0]
+            else:
+                header = self.new_block()
+                for source, kind in exits:
+                    self.link(source, header, kind)
+            self.add_header(header, node, node.body[0].lineno)
+            breaks = []
+            self.loops.append((header, breaks))
+            for source, kind in self.body(node.body, [(header, 'branch')]):
+                self.link(source, header, 'loop')
+            self.loops.pop()
+            endless = isinstance(node, ast.While) and isinstance(node.test, ast.Constant) and node.test.value
+            after = [] if endless else self.body(node.orelse, [(header, 'branch')])
+            return after + [(block, 'jump') for block in breaks]
+
+        if isinstance(node, TRY_TYPES):
+            block = self.block_for(exits)
+            self.add_lines(block, node.lineno, node.lineno)
+            frame = (len(self.loops), [])
+            if node.finalbody:
+                self.finally_frames.append(frame)
+            self.try_blocks.append([])
+            entry = self.new_block()
+            self.link(block, entry, 'flow')
+            body_exits = self.body(node.body, [(entry, 'flow')])
+            raising = self.try_blocks.pop()
+            if self.try_blocks:
+                # What the inner handlers don't catch reaches the enclosing try's handlers;
+                # the handler, else and finally blocks made from here on register there directly
+                self.try_blocks[-1].extend(raising)
+
+            after = body_exits
+            if node.orelse:
+                # The else block runs after the body, outside the handlers' reach
+                else_block = self.new_block()
+                for source, kind in body_exits:
+                    self.link(source, else_block, kind)
+                after = self.body(node.orelse, [(else_block, 'flow')])
+            for handler in node.handlers:
+                handler_block = self.new_block()
+                self.add_header(handler_block, handler, handler.body[0].lineno)
+                for source in raising:
+                    self.link(source, handler_block, 'exception')
+                after += self.body(handler.body, [(handler_block, 'flow')])
+            if not node.finalbody:
+                return after
+            self.finally_frames.pop()
+            final_block = self.new_block()
+            for source, kind in after:
+                self.link(source, final_block, kind)
+            if not node.handlers:
+                for source in raising:
+                    self.link(source, final_block, 'exception')
+            for source, _ in frame[1]:
+                self.link(source, final_block, 'jump')
+            final_exits = self.body(node.finalbody, [(final_block, 'flow')])
+            # Then on to wherever the jumps that entered the finally block were going
+            for target in dict.fromkeys(target for _, target in frame[1]):
+                for source, _ in final_exits:
+                    self.jump(source, target)
+            return final_exits if after else []
+
+        if isinstance(node, WITH_TYPES):
+            block = self.block_for(exits)
+            self.add_header(block, node, node.body[0].lineno)
+            return self.body(node.body, [(block, 'flow')])
+
+        if isinstance(node, ast.Match):
+            block = self.block_for(exits)
+            self.add_header(block, node, node.cases[0].pattern.lineno)
+            after = [(block, 'branch')]
+            for case in node.cases:
+                case_block = self.new_block()
+                self.link(block, case_block, 'branch')
+                self.add_lines(case_block, case.pattern.lineno, max(case.pattern.lineno, case.body[0].lineno - 1))
+                after += self.body(case.body, [(case_block, 'flow')])
+            return after
+
+        if isinstance(node, FUNCTION_TYPES):
+            # The def statement only binds a name; its body is a graph of its own
+            block = self.block_for(exits)
+            self.add_header(block, node, node.body[0].lineno)
+            saved = self.loops, self.try_blocks, self.finally_frames
+            self.loops, self.try_blocks, self.finally_frames = [], [], []
+            self.body(node.body, [(block, 'def')])
+            self.loops, self.try_blocks, self.finally_frames = saved
+            return [(block, 'flow')]
+
+        if isinstance(node, ast.ClassDef):
+            # Class bodies run in place when the class statement executes
+            block = self.block_for(exits)
+            self.add_header(block, node, node.body[0].lineno)
+            return self.body(node.body, [(block, 'flow')])
+
+        block = self.block_for(exits)
+        self.add_lines(block, node.lineno, node.end_lineno or node.lineno)
+        if isinstance(node, ast.Raise):
+            return []
+        if isinstance(node, ast.Return):
+            self.jump(block, 'return')
+            return []
+        if isinstance(node, ast.Break) and self.loops:
+            self.jump(block, 'break')
+            return []
+        if isinstance(node, ast.Continue) and self.loops:
+            self.jump(block, 'continue')
+            return []
+        return [(block, 'flow')]
+
+
+def build_cfg_graph(code_string):
+    """Builds a basic-block graph whose node ids are block numbers starting at 1."""
+    tree = parse_code(code_string)
+    code_lines = code_string.splitlines()
+    num_lines = len(code_lines)
+    builder = CFGBuilder()
+    builder.body(tree.body, [])
+
+    # Blank lines and comments belong to no block
+    line_index = np.full(num_lines + 1, -1, dtype=np.int32)
+    for block, ranges in enumerate(builder.ranges):
+        for first, last in reversed(ranges):
+            lines = line_index[first:last + 1]
+            lines[lines < 0] = block
+
+    # A block takes the most important type among its lines (lowest non-zero code)
+    node_types, _, _ = analyze_tree(tree, num_lines)
+    line_types = np.zeros(num_lines + 1, dtype=np.uint8)
+    for line_no, node_type in node_types.items():
+        if 1 <= line_no <= num_lines:
+            line_types[line_no] = TYPE_CODES[node_type]
+    ranked = np.where(line_types > 0, line_types, 255)
+    types = np.zeros(len(builder.ranges), dtype=np.uint8)
+    for block, ranges in enumerate(builder.ranges):
+        best = min((int(ranked[first:last + 1].min()) for first, last in ranges), default=255)
+        types[block] = best if best != 255 else 0
+
+    code = [code_lines[ranges[0][0] - 1].strip() if ranges else '' for ranges in builder.ranges]
+    edges = np.array(builder.edges, dtype=np.int64).reshape(-1, 3)
+    return CodeGraph.from_edges(
+        np.arange(1, len(builder.ranges) + 1), code, types, edges[:, 0], edges[:, 1], line_index,
+        edge_kinds=edges[:, 2], line_ranges=builder.ranges,
+    )
+
+
+def block_steps(graph, trace, threads=None):
+    """Maps a line trace onto block indices, one step per block entered.
+
+    Consecutive lines that move forward inside the same block are one visit; a line
+    at or before the previous one means the block was entered again (e.g. a loop).
+    Returns the steps and, when `threads` is given, the thread of each step.
+    """
+    lines = np.asarray(trace, dtype=np.int64)
+    steps = graph.nodes_for_lines(lines)
+    inside = steps >= 0
+    lines, steps = lines[inside], steps[inside]
+    if threads is None:
+        entered = np.ones(len(steps), dtype=bool)
+        entered[1:] = (steps[1:] != steps[:-1]) | (lines[1:] <= lines[:-1])
+        return steps[entered], None
+
+    # Compare each step with the previous step of its own thread, not the interleaved one
+    threads = np.asarray(threads)[inside]
+    order = np.argsort(threads, kind='stable')
+    ordered_steps, ordered_lines, ordered_threads = steps[order], lines[order], threads[order]
+    entered = np.ones(len(steps), dtype=bool)
+    entered[order[1:]] = ((ordered_steps[1:] != ordered_steps[:-1]) | (ordered_lines[1:] <= ordered_lines[:-1])
+                          | (ordered_threads[1:] != ordered_threads[:-1]))
+    return steps[entered], threads[entered]
+
+
+def block_transitions(graph, trace, threads=None):
+    steps, step_threads = block_steps(graph, trace, threads)
+    return steps, step_threads, transition_counts(steps, graph.num_nodes, step_threads)
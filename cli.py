@@ -0,0 +1,112 @@
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# --- Batch Precomputation ---
+def expand_inputs(patterns):
+    """Expands files, directories and glob patterns into a sorted list of .py files."""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '**', '*.py')
+        matches = glob.glob(pattern, recursive=True) or ([pattern] if os.path.isfile(pattern) else [])
+        paths.update(os.path.abspath(path) for path in matches if path.endswith('.py'))
+    return sorted(paths)
+
+
+def output_path(out_dir, base_dir, path):
+    relative = os.path.relpath(path, base_dir)
+    return os.path.join(out_dir, os.path.splitext(relative)[0] + '.json')
+
+
+def process_file(path, options, out_file, cache_dir, exports=()):
+    """Runs the server pipeline on one file inside a worker process."""
+    # Imported here so each worker only pays for the pipeline it actually runs
+    from pipeline import build_graph_response, response_key, store_cached, encode_body
+    from export import EXPORT_FORMATS, export_trace
+
+    started = time.perf_counter()
+    try:
+        with open(path, encoding='utf-8') as f:
+            code = f.read()
+        # The traced script's print() output would interleave with our progress report
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = build_graph_response(code, **options)
+        body = json.dumps(response).encode('utf-8')
+        if out_file:
+            os.makedirs(os.path.dirname(out_file), exist_ok=True)
+            with open(out_file, 'wb') as f:
+                f.write(body)
+        if cache_dir:
+            store_cached(cache_dir, response_key(code, options), encode_body(body))
+        for fmt in exports:
+            # A separate run, traced with call events; streamed to disk as it is written
+            with contextlib.redirect_stdout(io.StringIO()):
+                chunks = export_trace(code, fmt)
+            with open(os.path.splitext(out_file)[0] + EXPORT_FORMATS[fmt][1], 'w', encoding='utf-8') as f:
+                f.writelines(chunks)
+        return path, None, time.perf_counter() - started
+    except Exception as e:
+        return path, str(e), time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Precompute Holodeck graphs, layouts and traces for many Python files.")
+    parser.add_argument('inputs', nargs='+', help="Python files, directories or glob patterns (quote them)")
+    parser.add_argument('--out', help="Write one response JSON per file into this directory")
+    parser.add_argument('--cache-dir', help="Also store responses in a server cache directory (HOLODECK_CACHE_DIR)")
+    parser.add_argument('--mode', choices=('lines', 'cfg'), default='lines', help="Graph mode (default: lines)")
+    parser.add_argument('--weighted-layout', action='store_true', help="Lay out graphs using runtime edge weights")
+    parser.add_argument('--async-tasks', action='store_true', help="Attribute the trace to asyncio tasks")
+    parser.add_argument('--memory', action='store_true', help="Profile per-line memory with tracemalloc (slower)")
+    parser.add_argument('--opcodes', action='store_true', help="Count executed bytecode instructions per line")
+    parser.add_argument('--frames', type=int, default=0,
+                        help="Summarize longer traces as at most this many playback frames (default: off)")
+    parser.add_argument('--export', action='append', choices=('chrome', 'speedscope'), default=[],
+                        help="Also write each trace for Perfetto ('chrome') or speedscope into --out; repeatable")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    if not args.out and not args.cache_dir:
+        parser.error("nothing to write: pass --out and/or --cache-dir")
+    if args.export and not args.out:
+        parser.error("--export writes next to the responses: pass --out")
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        parser.error("no Python files matched")
+
+    options = {'mode': args.mode, 'weighted_layout': args.weighted_layout, 'async_tasks': args.async_tasks,
+               'memory': args.memory, 'opcodes': args.opcodes, 'frames': max(0, args.frames)}
+    base_dir = os.path.commonpath([os.path.dirname(path) for path in paths])
+    failures = 0
+    started = time.perf_counter()
+    # One task per process: a script that outlives its trace timeout leaves a
+    # traced thread behind, which must not slow down the next file.
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), max_tasks_per_child=1) as pool:
+        futures = [
+            pool.submit(process_file, path, options,
+                        output_path(args.out, base_dir, path) if args.out else None, args.cache_dir,
+                        args.export)
+            for path in paths
+        ]
+        for future in as_completed(futures):
+            path, error, seconds = future.result()
+            if error:
+                failures += 1
+                print(f"FAIL {os.path.relpath(path)} ({seconds:.2f}s): {error}", file=sys.stderr)
+            else:
+                print(f"ok   {os.path.relpath(path)} ({seconds:.2f}s)", file=sys.stderr)
+
+    print(f"Processed {len(paths)} files in {time.perf_counter() - started:.2f}s, {failures} failed.", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
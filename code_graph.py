@@ -0,0 +1,182 @@
+import ast
+import numpy as np
+from graph_core import CodeGraph, TYPE_CODES, EDGE_KINDS
+from layout import spring_layout_3d, multilevel_layout_3d, layout_weight, merge_edge_weights, MULTILEVEL_MIN_NODES
+
+# --- AST and Graph Generation (from HoloDeck5.py) ---
+class NetworkVisitor(ast.NodeVisitor):
+    def __init__(self, num_lines):
+        self.num_lines = num_lines
+        self.node_types = {}
+        # Kept as dict keys so duplicates collapse like they do in a DiGraph
+        self.edges = {}
+        self.type_priority = {
+            'definition': 6,
+            'control_flow': 5,
+            'function_call': 4,
+            'operation': 3,
+            'data_change': 2,
+            'literal': 1
+        }
+
+    def has_line(self, line_no):
+        return 1 <= line_no <= self.num_lines
+
+    def add_edge(self, source, target):
+        # Ensure both source and target nodes exist before adding an edge
+        if self.has_line(source) and self.has_line(target):
+            self.edges[(source, target)] = None
+
+    def visit(self, node):
+        if hasattr(node, 'lineno'):
+            line_no = node.lineno
+            node_type = self.get_node_type(node)
+            if node_type:
+                current_priority = self.type_priority.get(self.node_types.get(line_no), 0)
+                new_priority = self.type_priority.get(node_type, 0)
+                if new_priority > current_priority:
+                    self.node_types[line_no] = node_type
+        self.generic_visit(node)
+
+    def visit_body(self, body_nodes, parent_lineno):
+        prev_lineno = parent_lineno
+        for node in body_nodes:
+            if not hasattr(node, 'lineno'): continue
+            # self.visit(node) # This is already called by generic_visit in the main traversal
+            self.add_edge(prev_lineno, node.lineno)
+            prev_lineno = node.lineno
+        return prev_lineno
+
+    def get_node_type(self, node):
+        """Categorizes an AST node into one of our 6 types."""
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef, ast.Import, ast.ImportFrom)):
+            return 'definition'
+        if isinstance(node, (ast.If, ast.For, ast.While, ast.Try, ast.Return, ast.Break, ast.Continue)):
+            return 'control_flow'
+        if isinstance(node, ast.Call):
+            return 'function_call'
+        if isinstance(node, (ast.Assign, ast.AugAssign, ast.List, ast.Dict, ast.Tuple, ast.Set)):
+            return 'data_change'
+        if isinstance(node, (ast.BinOp, ast.Compare, ast.BoolOp, ast.UnaryOp)):
+            return 'operation'
+        if isinstance(node, ast.Constant):
+            return 'literal'
+        return None
+
+    def visit_FunctionDef(self, node):
+        self.visit_body(node.body, node.lineno)
+        self.generic_visit(node)
+
+    def visit_For(self, node):
+        last_body_node_lineno = self.visit_body(node.body, node.lineno)
+        # Edge from end of loop back to the start
+        self.add_edge(last_body_node_lineno, node.lineno)
+        self.generic_visit(node)
+
+    def visit_While(self, node):
+        last_body_node_lineno = self.visit_body(node.body, node.lineno)
+        # Edge from end of loop back to the start
+        self.add_edge(last_body_node_lineno, node.lineno)
+        self.generic_visit(node)
+
+    def visit_If(self, node):
+        self.visit_body(node.body, node.lineno)
+        if node.orelse:
+            self.visit_body(node.orelse, node.lineno)
+        self.generic_visit(node)
+
+
+def parse_code(code_string):
+    try:
+        return ast.parse(code_string)
+    except SyntaxError as e:
+        # Re-raise with more context for the frontend
+        raise SyntaxError(f"Error parsing Python code on line {e.lineno}: {(e.text or '').strip()}\n{e.msg}")
+
+
+def analyze_tree(tree, num_lines):
+    """Classifies each line and collects the edges inside the top-level statements.
+
+    Returns (node_types, edges, top_level_lines); the caller chains the top-level
+    statements together, which lets the incremental analyzer reuse this per block.
+    """
+    visitor = NetworkVisitor(num_lines)
+    visitor.visit(tree)
+    top_level_lines = [node.lineno for node in tree.body if hasattr(node, 'lineno')]
+    return visitor.node_types, list(visitor.edges), top_level_lines
+
+
+def assemble_graph(code_lines, node_types, edges, top_level_lines):
+    num_lines = len(code_lines)
+    # Every line is a node; node i holds line i + 1
+    ids = np.arange(1, num_lines + 1, dtype=np.int32)
+    types = np.zeros(num_lines, dtype=np.uint8)
+    for line_no, node_type in node_types.items():
+        if 1 <= line_no <= num_lines:
+            types[line_no - 1] = TYPE_CODES[node_type]
+
+    # Explicitly link the top-level body in order
+    pairs = list(edges) + list(zip(top_level_lines, top_level_lines[1:]))
+    lines = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    line_index = np.arange(-1, num_lines, dtype=np.int32)
+    return CodeGraph.from_edges(ids, [line.strip() for line in code_lines], types,
+                                lines[:, 0] - 1, lines[:, 1] - 1, line_index)
+
+
+def build_code_graph(code_string):
+    tree = parse_code(code_string)
+    code_lines = code_string.splitlines()
+    node_types, edges, top_level_lines = analyze_tree(tree, len(code_lines))
+    return assemble_graph(code_lines, node_types, edges, top_level_lines)
+
+
+def layout_3d(graph, transitions=None, pos=None, fixed=None, iterations=50):
+    """Places the graph's nodes in 3D, returning an (n, 3) array.
+
+    `transitions` are the (source, target, count) node-index arrays observed in a
+    trace; when given, frequently taken paths pull their nodes together.
+    """
+    sources, targets = graph.edge_arrays()
+    weights = np.ones(len(sources))
+    if transitions is not None:
+        hot_sources, hot_targets, counts = transitions
+        sources = np.concatenate((sources, hot_sources))
+        targets = np.concatenate((targets, hot_targets))
+        weights = np.concatenate((weights, layout_weight(counts)))
+        sources, targets, weights = merge_edge_weights(graph.num_nodes, sources, targets, weights)
+
+    if pos is None and graph.num_nodes >= MULTILEVEL_MIN_NODES:
+        # Long files: coarsen, embed spectrally and refine level by level
+        return multilevel_layout_3d(graph.num_nodes, sources, targets, weights, k=0.5, seed=42)
+
+    # Use a 3D spring layout
+    return spring_layout_3d(graph.num_nodes, sources, targets, weights, pos=pos, fixed=fixed,
+                            k=0.5, iterations=iterations, seed=42)
+
+
+def generate_3d_network(code_string, transitions=None):
+    graph = build_code_graph(code_string)
+    return graph, layout_3d(graph, transitions)
+
+
+def serialize_graph(graph, pos):
+    """Formats the graph and its layout the way the frontend expects them."""
+    # Scale positions to fit the frontend's desired [-10, 10] cube
+    positions = (np.asarray(pos) * 10).tolist()
+    nodes = [
+        {"id": node_id, "code": code, "type": node_type, "position": position}
+        for node_id, code, node_type, position in zip(graph.ids.tolist(), graph.code, graph.type_names(), positions)
+    ]
+    if graph.line_ranges is not None:
+        for node, ranges in zip(nodes, graph.line_ranges):
+            node["lines"] = ranges
+
+    sources, targets = graph.edge_arrays()
+    edges = [
+        {"source": source, "target": target}
+        for source, target in zip(graph.ids[sources].tolist(), graph.ids[targets].tolist())
+    ]
+    if graph.edge_kinds is not None:
+        for edge, kind in zip(edges, graph.edge_kinds.tolist()):
+            edge["kind"] = EDGE_KINDS[kind]
+    return nodes, edges
@@ -0,0 +1,169 @@
+import json
+import numpy as np
+from tracer import run_trace_detailed, CALL, RETURN
+
+# Merged timelines mark line steps with this next to the tracer's CALL and RETURN
+LINE = 2
+# Events formatted per yielded chunk
+CHUNK_EVENTS = 10_000
+# Longest source excerpt in a line event's name
+MAX_LABEL_LENGTH = 60
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+# --- Event Timelines ---
+def line_labels(code, lines):
+    """'12: total += i' style names for the given line numbers."""
+    source = code.splitlines()
+    return {line: f'{line}: {source[line - 1].strip()[:MAX_LABEL_LENGTH]}' if 0 < line <= len(source) else f'{line}'
+            for line in lines}
+
+
+def thread_events(result, thread):
+    """One thread's line steps and call events merged in time order.
+
+    Returns (timestamps, kinds, values, durations) arrays; the value is a line
+    number for LINE and a function index otherwise. A line lasts until the
+    thread's next event, so line slices nest inside their function's call.
+    """
+    steps = result.step_threads == thread
+    timestamps, kinds, values = [result.timestamps[steps]], [np.full(steps.sum(), LINE)], [result.lines[steps]]
+    if result.calls is not None:
+        rows = result.calls["events"]
+        rows = rows[rows[:, 1] == thread]
+        timestamps.append(rows[:, 0])
+        kinds.append(rows[:, 3])
+        values.append(rows[:, 2])
+    timestamps, kinds, values = np.concatenate(timestamps), np.concatenate(kinds), np.concatenate(values)
+    # At equal timestamps the call or return comes first
+    order = np.lexsort((kinds == LINE, timestamps))
+    timestamps, kinds, values = timestamps[order], kinds[order], values[order]
+    end = max(result.duration, int(timestamps[-1])) if timestamps.size else result.duration
+    durations = np.diff(timestamps, append=end)
+    return timestamps, kinds, values, durations
+
+
+def balanced_events(timestamps, kinds, values, durations, end):
+    """Yields (timestamp, kind, value, duration) with calls and returns properly nested.
+
+    A return closes any frames opened after its call that never returned; one
+    with no open call is dropped; frames still open at the end are closed there.
+    """
+    stack = []
+    open_counts = {}
+    for timestamp, kind, value, duration in _chunked_rows(timestamps, kinds, values, durations):
+        if kind == CALL:
+            stack.append(value)
+            open_counts[value] = open_counts.get(value, 0) + 1
+            yield timestamp, kind, value, duration
+        elif kind == RETURN:
+            if not open_counts.get(value):
+                continue
+            while stack:
+                top = stack.pop()
+                open_counts[top] -= 1
+                yield timestamp, RETURN, top, 0
+                if top == value:
+                    break
+        else:
+            yield timestamp, kind, value, duration
+    while stack:
+        yield end, RETURN, stack.pop(), 0
+
+
+def _chunked_rows(*columns):
+    # Converts to Python ints a chunk at a time, never the whole timeline at once
+    for start in range(0, len(columns[0]), CHUNK_EVENTS):
+        yield from zip(*(column[start:start + CHUNK_EVENTS].tolist() for column in columns))
+
+
+def _thread_timelines(result):
+    for index in range(len(result.threads)):
+        timeline = thread_events(result, index)
+        end = int(timeline[0][-1] + timeline[3][-1]) if timeline[0].size else result.duration
+        yield index, end, balanced_events(*timeline, end)
+
+
+# --- Chrome Trace Event Format ---
+def chrome_trace(result, code):
+    """Streams a trace as Chrome Trace Event JSON, for Perfetto or chrome://tracing.
+
+    Calls become B/E slices and each line step an X slice inside them. Timestamps
+    are the tracer's perf_counter_ns readings, written in microseconds.
+    """
+    functions = [json.dumps(function["name"]) for function in (result.calls or {}).get("functions", [])]
+    names = {line: json.dumps(label) for line, label in line_labels(code, np.unique(result.lines).tolist()).items()}
+
+    yield '{"displayTimeUnit":"ns","traceEvents":[\n'
+    yield '{"ph":"M","pid":1,"tid":0,"name":"process_name","args":{"name":"holodeck"}}'
+    for tid, end, events in _thread_timelines(result):
+        name = json.dumps(result.threads[tid]["name"])
+        chunk = [f'{{"ph":"M","pid":1,"tid":{tid},"name":"thread_name","args":{{"name":{name}}}}}']
+        for timestamp, kind, value, duration in events:
+            if kind == LINE:
+                chunk.append(f'{{"ph":"X","pid":1,"tid":{tid},"ts":{timestamp / 1000:.3f},'
+                             f'"dur":{duration / 1000:.3f},"cat":"line","name":{names[value]}}}')
+            else:
+                chunk.append(f'{{"ph":"{"B" if kind == CALL else "E"}","pid":1,"tid":{tid},'
+                             f'"ts":{timestamp / 1000:.3f},"cat":"call","name":{functions[value]}}}')
+            if len(chunk) >= CHUNK_EVENTS:
+                yield ',\n' + ',\n'.join(chunk)
+                chunk.clear()
+        if chunk:
+            yield ',\n' + ',\n'.join(chunk)
+    yield '\n]}\n'
+
+
+# --- Speedscope Format ---
+def speedscope_profile(result, code, name='holodeck'):
+    """Streams a trace as a speedscope evented profile, one profile per thread.
+
+    Functions are frames, and each line step is a leaf frame opened on top of
+    the function it ran in.
+    """
+    functions = (result.calls or {}).get("functions", [])
+    lines = np.unique(result.lines).tolist()
+    line_frames = {line: len(functions) + index for index, line in enumerate(lines)}
+    frames = [{"name": function["name"], "line": function["line"]} for function in functions]
+    frames += [{"name": label, "line": line} for line, label in line_labels(code, lines).items()]
+
+    yield (f'{{"$schema":"{SPEEDSCOPE_SCHEMA}","exporter":"holodeck","name":{json.dumps(name)},'
+           f'"activeProfileIndex":0,"shared":{{"frames":{json.dumps(frames)}}},"profiles":[\n')
+    for tid, end, events in _thread_timelines(result):
+        yield (f'{"," if tid else ""}{{"type":"evented","name":{json.dumps(result.threads[tid]["name"])},'
+               f'"unit":"nanoseconds","startValue":0,"endValue":{end},"events":[\n')
+        chunk = []
+        separator = ''
+        for timestamp, kind, value, duration in events:
+            if kind == LINE:
+                frame = line_frames[value]
+                chunk.append(f'{{"type":"O","frame":{frame},"at":{timestamp}}},'
+                             f'{{"type":"C","frame":{frame},"at":{timestamp + duration}}}')
+            else:
+                chunk.append(f'{{"type":"{"O" if kind == CALL else "C"}","frame":{value},"at":{timestamp}}}')
+            if len(chunk) >= CHUNK_EVENTS:
+                yield separator + ',\n'.join(chunk)
+                separator = ',\n'
+                chunk.clear()
+        if chunk:
+            yield separator + ',\n'.join(chunk)
+        yield '\n]}'
+    yield '\n]}\n'
+
+
+# --- Exports ---
+# Format name -> (writer, file suffix)
+EXPORT_FORMATS = {
+    'chrome': (chrome_trace, '.trace.json'),
+    'speedscope': (speedscope_profile, '.speedscope.json'),
+}
+
+
+def export_trace(code, fmt, timeout=5):
+    """Traces the script with call events and returns the chosen format's chunk generator.
+
+    The script runs before this returns, so a failing run never leaves a
+    half-written export behind.
+    """
+    writer, _ = EXPORT_FORMATS[fmt]
+    result = run_trace_detailed(code, timeout=timeout, calls=True)
+    return writer(result, code)
@@ -0,0 +1,83 @@
+import numpy as np
+
+# Node type codes; 0 means the line holds no classified statement
+NODE_TYPES = (None, 'definition', 'control_flow', 'function_call', 'operation', 'data_change', 'literal')
+TYPE_CODES = {name: code for code, name in enumerate(NODE_TYPES) if name}
+# Untyped nodes are drawn like plain data changes
+DEFAULT_TYPE = 'data_change'
+# Edge kind codes, used by the basic-block graph; line graphs leave them unset
+EDGE_KINDS = ('flow', 'branch', 'loop', 'exception', 'jump', 'def')
+
+# --- Compact Graph ---
+class CodeGraph:
+    """A directed graph stored as flat NumPy arrays.
+
+    Nodes are numbered 0..n-1. `ids` holds the id the frontend sees for each node
+    (its line number, or its block number in a basic-block graph), `line_index` maps
+    every source line to its node index (-1 for none) and the edges are kept in CSR
+    form: the targets of node i are `indices[indptr[i]:indptr[i + 1]]`.
+    """
+
+    def __init__(self, ids, code, types, indptr, indices, line_index, edge_kinds=None, line_ranges=None):
+        self.ids = ids
+        self.code = code
+        self.types = types
+        self.indptr = indptr
+        self.indices = indices
+        self.line_index = line_index
+        # Optional per-edge EDGE_KINDS codes, aligned with `indices`
+        self.edge_kinds = edge_kinds
+        # Optional per-node [[first, last], ...] line ranges when a node spans lines
+        self.line_ranges = line_ranges
+
+    @classmethod
+    def from_edges(cls, ids, code, types, sources, targets, line_index, edge_kinds=None, line_ranges=None):
+        """Builds the CSR arrays from node-index edge lists, dropping duplicates."""
+        n = len(ids)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        pairs, first = (np.unique(sources * n + targets, return_index=True) if n
+                        else (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)))
+        sources, targets = pairs // max(n, 1), pairs % max(n, 1)
+        indptr = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+        if edge_kinds is not None:
+            # The first kind given for a duplicated edge wins
+            edge_kinds = np.asarray(edge_kinds, dtype=np.uint8)[first]
+        return cls(np.asarray(ids, dtype=np.int32), code, np.asarray(types, dtype=np.uint8),
+                   indptr, targets.astype(np.int32), np.asarray(line_index, dtype=np.int32),
+                   edge_kinds, line_ranges)
+
+    @property
+    def num_nodes(self):
+        return len(self.ids)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    def edge_sources(self):
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(self.indptr))
+
+    def edge_arrays(self):
+        """Returns the (source, target) node indices of every edge."""
+        return self.edge_sources(), self.indices
+
+    def nodes_for_lines(self, lines):
+        """Maps line numbers to node indices, -1 where a line has no node."""
+        lines = np.asarray(lines, dtype=np.int64)
+        inside = (lines >= 0) & (lines < len(self.line_index))
+        return np.where(inside, self.line_index[np.clip(lines, 0, len(self.line_index) - 1)], -1)
+
+    def type_names(self):
+        return [NODE_TYPES[code] or DEFAULT_TYPE for code in self.types.tolist()]
+
+    def to_networkx(self):
+        """Optional adapter for tools that want a networkx.DiGraph."""
+        import networkx as nx
+        graph = nx.DiGraph()
+        for node_id, code, node_type in zip(self.ids.tolist(), self.code, self.types.tolist()):
+            graph.add_node(node_id, code=code, **({'type': NODE_TYPES[node_type]} if node_type else {}))
+        sources, targets = self.edge_arrays()
+        graph.add_edges_from(zip(self.ids[sources].tolist(), self.ids[targets].tolist()))
+        return graph
@@ -0,0 +1,24 @@
+# Gunicorn settings for serving the Holodeck backend: gunicorn -c gunicorn.conf.py wsgi:app
+# Every setting can be overridden from the environment.
+import gc
+import os
+
+bind = os.environ.get('HOLODECK_BIND', '0.0.0.0:5001')
+# Traces hold the GIL while they run, so throughput scales with processes, not threads
+workers = int(os.environ.get('HOLODECK_WORKERS', os.cpu_count() or 1))
+# Threads keep slow clients and the /api/live websockets from blocking a worker
+threads = int(os.environ.get('HOLODECK_THREADS', 4))
+worker_class = 'gthread'
+# Import the analysis modules once in the master, before forking the workers
+preload_app = True
+# Traces stop after 5 seconds, but coverage requests run many of them
+timeout = int(os.environ.get('HOLODECK_TIMEOUT', 120))
+# Recycle workers now and then: a script that ignores its trace timeout leaves a thread behind
+max_requests = int(os.environ.get('HOLODECK_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+
+def pre_fork(server, worker):
+    # Move the preloaded objects out of the collector's reach, so collections in the
+    # workers don't touch (and un-share) the pages holding them
+    gc.freeze()
@@ -1,11 +1,14 @@
 
 import { create } from 'zustand';
-import { GraphData, ExecutionTrace, ExecutionStatus, CameraMode } from '../types';
+import { GraphData, ExecutionTrace, ExecutionStatus, CameraMode, GraphDelta, PlaybackSummary } from '../types';
 import { generateGraphFromCode } from '../services/geminiService';
 
 interface CodeGraphState {
   graphData: GraphData | null;
   executionTrace: ExecutionTrace | null;
+  // Set for long traces: executionTrace then holds one node per frame, and
+  // currentStep is a frame index into the summary's raw step ranges
+  playback: PlaybackSummary | null;
   currentStep: number;
   activeNodeId: number | null;
   isTracing: boolean;
@@ -16,6 +19,8 @@ interface CodeGraphState {
   fileName: string | null;
 
   loadCode: (code: string, fileName: string) => Promise<void>;
+  applyGraphDelta: (delta: GraphDelta) => void;
+  setExecutionTrace: (trace: ExecutionTrace) => void;
   startTrace: () => void;
   stopTrace: () => void;
   resetTrace: () => void;
@@ -27,6 +32,7 @@ interface CodeGraphState {
 export const useCodeGraphStore = create<CodeGraphState>((set, get) => ({
   graphData: null,
   executionTrace: null,
+  playback: null,
   currentStep: -1,
   activeNodeId: null,
   isTracing: false,
@@ -37,12 +43,13 @@ export const useCodeGraphStore = create<CodeGraphState>((set, get) => ({
   fileName: null,
 
   loadCode: async (code: string, fileName: string) => {
-    set({ status: 'loading', error: null, graphData: null, executionTrace: null, fileName });
+    set({ status: 'loading', error: null, graphData: null, executionTrace: null, playback: null, fileName });
     try {
-      const { graph, trace } = await generateGraphFromCode(code);
+      const { graph, trace, playback } = await generateGraphFromCode(code);
       set({
         graphData: graph,
         executionTrace: trace,
+        playback: playback ?? null,
         status: 'ready',
         currentStep: -1,
         activeNodeId: null,
@@ -54,6 +61,49 @@ export const useCodeGraphStore = create<CodeGraphState>((set, get) => ({
     }
   },
 
+  applyGraphDelta: (delta: GraphDelta) => {
+    set(state => {
+      const removed = new Set(delta.nodes.removed);
+      const changed = new Map(delta.nodes.changed.map(node => [node.id, node]));
+      const edgeKey = (edge: { source: number; target: number }) => `${edge.source}-${edge.target}`;
+      const removedEdges = new Set(delta.edges.removed.map(edgeKey));
+
+      // Renumber the lines that only moved, so the rest of the delta matches the server's ids
+      let previousNodes = state.graphData?.nodes ?? [];
+      let previousEdges = state.graphData?.edges ?? [];
+      for (const { from, by } of delta.shifts ?? []) {
+        const dropped = (id: number) => id >= from + Math.min(by, 0) && id < from;
+        const move = (id: number) => (id >= from ? id + by : id);
+        previousNodes = previousNodes
+          .filter(node => !dropped(node.id))
+          .map(node => (node.id >= from ? { ...node, id: node.id + by } : node));
+        previousEdges = previousEdges
+          .filter(edge => !dropped(edge.source) && !dropped(edge.target))
+          .map(edge => (edge.source >= from || edge.target >= from
+            ? { ...edge, source: move(edge.source), target: move(edge.target) } : edge));
+      }
+
+      // Only touched nodes get new objects, so unchanged ones skip re-rendering
+      const nodes = previousNodes
+        .filter(node => !removed.has(node.id))
+        .map(node => {
+          const update = changed.get(node.id);
+          const position = delta.positions[node.id];
+          return update || position ? { ...node, ...update, position: position ?? node.position } : node;
+        })
+        .concat(delta.nodes.added);
+      const edges = previousEdges
+        .filter(edge => !removedEdges.has(edgeKey(edge)))
+        .concat(delta.edges.added);
+
+      return { graphData: { nodes, edges }, status: state.status === 'idle' ? 'ready' : state.status };
+    });
+  },
+
+  setExecutionTrace: (trace: ExecutionTrace) => {
+    set({ executionTrace: trace, playback: null, currentStep: -1, activeNodeId: null });
+  },
+
   startTrace: () => {
     if (get().status === 'finished') {
         get().resetTrace();
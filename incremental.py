@@ -0,0 +1,249 @@
+import ast
+import hashlib
+import threading
+import numpy as np
+from code_graph import parse_code, analyze_tree, assemble_graph, layout_3d
+
+# Lines starting with these keywords continue the statement above them
+CONTINUATION_KEYWORDS = ('else', 'elif', 'except', 'finally')
+CLOSING_BRACKETS = (')', ']', '}')
+# Characters that can change the bracket/string state of a line
+STATE_CHARS = frozenset('\'"#()[]{}\\')
+
+# --- Top-Level Statement Splitting ---
+def _scan_line(line, depth, quote):
+    """Returns the (bracket depth, open triple quote) state after `line`."""
+    if not STATE_CHARS.intersection(line):
+        return depth, quote
+    i, n = 0, len(line)
+    while i < n:
+        ch = line[i]
+        if quote:
+            if ch == '\\':
+                i += 2
+                continue
+            if line.startswith(quote, i):
+                i += len(quote)
+                quote = None
+                continue
+        elif ch == '#':
+            break
+        elif ch in '"\'':
+            triple = line[i:i + 3]
+            quote = triple if triple in ('"""', "'''") else ch
+            i += len(quote)
+            continue
+        elif ch in '([{':
+            depth += 1
+        elif ch in ')]}':
+            depth = max(depth - 1, 0)
+        i += 1
+    # Single-quoted strings cannot span lines
+    if quote in ('"', "'"):
+        quote = None
+    return depth, quote
+
+
+def split_top_level(lines, scan_cache=None):
+    """Splits source lines into chunks that each start a top-level statement.
+
+    This is a cheap line scan, not a parse: a chunk that turns out not to parse on
+    its own is merged with its neighbour by the analyzer.
+    """
+    scan_cache = {} if scan_cache is None else scan_cache
+    starts = [0]
+    depth, quote = 0, None
+    continued = after_decorator = False
+    for i, line in enumerate(lines):
+        at_statement = depth == 0 and quote is None and not continued
+        if (at_statement and i > 0 and line[:1] not in ('', ' ', '\t', '#')
+                and not line.startswith(CLOSING_BRACKETS)
+                and line.split(None, 1)[0].rstrip(':') not in CONTINUATION_KEYWORDS
+                and not after_decorator):
+            starts.append(i)
+        if at_statement and line[:1] not in ('', ' ', '\t', '#'):
+            after_decorator = line.startswith('@')
+
+        key = (line, depth, quote)
+        state = scan_cache.get(key)
+        if state is None:
+            state = scan_cache[key] = _scan_line(line, depth, quote)
+        depth, quote = state
+        continued = line.rstrip().endswith('\\') and quote is None
+    return [(start, end) for start, end in zip(starts, starts[1:] + [len(lines)])]
+
+
+# --- Incremental Analyzer ---
+def _block_key(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+class IncrementalAnalyzer:
+    """Re-analyzes only the top-level statements that changed since the last update.
+
+    Each chunk of source is keyed by a hash of its text. Unchanged chunks reuse their
+    cached classification and edges (shifted to their new line numbers) and keep
+    their previous layout positions; only new nodes are placed by the spring layout.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.blocks = {}
+        self.scan_cache = {}
+        # Layout of the last update, indexed by line number (NaN where unknown)
+        self.positions = np.empty((0, 3))
+        self.carried = None
+        self.stats = {}
+
+    def _parse_block(self, text):
+        tree = ast.parse(text)
+        node_types, edges, top_level = analyze_tree(tree, text.count('\n') + 1)
+        return {'types': node_types, 'edges': edges, 'top_level': top_level, 'starts': []}
+
+    def update(self, code_string):
+        code_lines = code_string.splitlines()
+        if len(self.scan_cache) > 4 * len(code_lines) + 1024:
+            self.scan_cache.clear()
+        chunks = split_top_level(code_lines, self.scan_cache)
+
+        node_types, edges, top_level = {}, [], []
+        blocks = {}
+        old_lines, new_lines = [], []
+        parsed = reparsed = 0
+        i = 0
+        while i < len(chunks):
+            start, end = chunks[i]
+            i += 1
+            parsed += 1
+            text = '\n'.join(code_lines[start:end])
+            key = _block_key(text)
+            block = self.blocks.get(key)
+            while block is None:
+                try:
+                    block = self._parse_block(text)
+                except SyntaxError:
+                    if i >= len(chunks):
+                        # Let the full parser report the error with real line numbers
+                        parse_code(code_string)
+                        raise
+                    # The line scan split a statement; merge with the next chunk
+                    end = chunks[i][1]
+                    i += 1
+                    text = '\n'.join(code_lines[start:end])
+                    key = _block_key(text)
+                    block = self.blocks.get(key)
+                else:
+                    reparsed += 1
+
+            offset = start
+            node_types.update((line + offset, t) for line, t in block['types'].items())
+            edges.extend((s + offset, t + offset) for s, t in block['edges'])
+            top_level.extend(line + offset for line in block['top_level'])
+
+            # Remember where the block's lines were so their positions carry over. Repeated
+            # chunks (two identical print(x) lines) take their previous starts in order.
+            placed = len(blocks[key]['starts']) if key in blocks else 0
+            if placed < len(block['starts']):
+                previous = block['starts'][placed]
+                old_lines.append(np.arange(previous + 1, previous + end - start + 1))
+                new_lines.append(np.arange(start + 1, end + 1))
+            if key not in blocks:
+                blocks[key] = dict(block, starts=[])
+            blocks[key]['starts'].append(start)
+
+        self.blocks = blocks
+        carried = np.full((len(code_lines) + 1, 3), np.nan)
+        if old_lines:
+            old_lines, new_lines = np.concatenate(old_lines), np.concatenate(new_lines)
+            known = old_lines < len(self.positions)
+            carried[new_lines[known]] = self.positions[old_lines[known]]
+        self.carried = carried
+        self.stats = {"blocks": parsed, "reparsed": reparsed, "reused": parsed - reparsed}
+        return assemble_graph(code_lines, node_types, edges, top_level)
+
+    def layout(self, graph, transitions=None):
+        pos = self.carried[graph.ids]
+        fixed = ~np.isnan(pos).any(axis=1)
+        if not fixed.any():
+            pos = layout_3d(graph, transitions)
+        elif not fixed.all():
+            # Unchanged nodes stay where they were; new ones settle around them
+            pos = layout_3d(graph, transitions, pos=pos, fixed=fixed, iterations=15)
+
+        self.positions = np.full((len(self.carried), 3), np.nan)
+        self.positions[graph.ids] = pos
+        return pos
+
+
+# --- Graph Deltas ---
+def shift_lines(previous, shifts):
+    """Renumbers a (nodes_by_id, edge_set) pair through a list of line shifts.
+
+    A (line, offset) shift moves the ids from `line` on by `offset`; a negative
+    offset first drops the ids `line + offset` .. `line - 1`, whose lines the edit
+    deleted. Clients apply the same rule to their copy of the graph.
+    """
+    nodes, edges = previous
+    for line, offset in shifts:
+        low = line + min(offset, 0)
+        nodes = {node_id + offset if node_id >= line else node_id: node
+                 for node_id, node in nodes.items() if not low <= node_id < line}
+        edges = {(s + offset if s >= line else s, t + offset if t >= line else t)
+                 for s, t in edges if not (low <= s < line or low <= t < line)}
+    return nodes, edges
+
+
+def graph_delta(previous, nodes, edges, shifts=(), tolerance=1e-3):
+    """Compares a serialized graph against the previous one sent to a client.
+
+    `previous` is the (nodes_by_id, edge_set) pair returned by the last call; the
+    return value is the delta to send plus the new pair to keep for next time.
+    `shifts` are the line shifts of the edits made since, so that lines which only
+    moved are matched to their new numbers instead of all being sent again.
+    """
+    old_nodes, old_edges = shift_lines(previous, shifts)
+    new_nodes = {node["id"]: node for node in nodes}
+    new_edges = {(edge["source"], edge["target"]) for edge in edges}
+
+    added, changed, moved = [], [], {}
+    for node_id, node in new_nodes.items():
+        old = old_nodes.get(node_id)
+        if old is None:
+            added.append(node)
+            continue
+        if old["code"] != node["code"] or old["type"] != node["type"]:
+            changed.append({"id": node_id, "code": node["code"], "type": node["type"]})
+        if max(abs(a - b) for a, b in zip(old["position"], node["position"])) > tolerance:
+            moved[node_id] = node["position"]
+
+    delta = {
+        "nodes": {
+            "added": added,
+            "removed": [node_id for node_id in old_nodes if node_id not in new_nodes],
+            "changed": changed,
+        },
+        "edges": {
+            "added": [{"source": s, "target": t} for s, t in new_edges - old_edges],
+            "removed": [{"source": s, "target": t} for s, t in old_edges - new_edges],
+        },
+        "positions": moved,
+        "shifts": [{"from": line, "by": offset} for line, offset in shifts],
+    }
+    return delta, (new_nodes, new_edges)
+
+
+def apply_edit(text, edit):
+    """Applies a {start, end, text} character-offset edit to the buffer.
+
+    Returns the new buffer and the edit's line shift, a (line, offset) pair for
+    shift_lines: the lines after the one the edit ends on move by the change in
+    newlines. The shift is None when no line moved.
+    """
+    start, end, insert = edit.get('start'), edit.get('end', edit.get('start')), edit.get('text', '')
+    offsets_valid = all(isinstance(value, int) and not isinstance(value, bool) for value in (start, end))
+    if not offsets_valid or not 0 <= start <= end <= len(text) or not isinstance(insert, str):
+        raise ValueError(f"An edit needs integer 'start' and 'end' with 0 <= start <= end <= {len(text)} "
+                         "and a string 'text'.")
+    offset = insert.count('\n') - text.count('\n', start, end)
+    shift = (text.count('\n', 0, end) + 2, offset) if offset else None
+    return text[:start] + insert + text[end:], shift
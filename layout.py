@@ -0,0 +1,197 @@
+import numpy as np
+
+# --- 3D Force-Directed Layout ---
+# Rows of the all-pairs repulsion are processed in blocks of this many nodes so the
+# temporary (block, n) arrays stay small on long files.
+REPULSION_BLOCK = 1024
+
+
+def layout_weight(count):
+    # Raw counts span several orders of magnitude on loops; a log scale keeps hot
+    # paths pulled together without collapsing the rest of the layout.
+    return 1.0 + np.log1p(count)
+
+
+def spring_layout_3d(num_nodes, sources, targets, weights=None, pos=None, fixed=None,
+                     k=0.5, iterations=50, seed=42, threshold=1e-4):
+    """Fruchterman-Reingold layout in three dimensions, in the style of networkx.
+
+    `pos` is an optional (n, 3) array of starting positions where NaN rows are
+    placed randomly, and `fixed` a boolean mask of nodes that must not move.
+    Forces are only computed for the nodes that move, so settling k new nodes
+    into a fixed layout costs O(k·n) per iteration rather than O(n²).
+    Edges attract in both directions with the given weights.
+    """
+    rng = np.random.RandomState(seed)
+    positions = rng.rand(num_nodes, 3)
+    if pos is not None:
+        known = ~np.isnan(pos).any(axis=1)
+        positions[known] = pos[known]
+    if num_nodes <= 1:
+        return positions if fixed is not None else np.zeros((num_nodes, 3))
+
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    weights = np.ones(len(sources)) if weights is None else np.asarray(weights, dtype=np.float64)
+    # Attraction works both ways regardless of the edge direction
+    pull_from = np.concatenate((sources, targets))
+    pull_to = np.concatenate((targets, sources))
+    pull_weight = np.concatenate((weights, weights))
+
+    # Start with a temperature of 10% of the layout's width, cooling linearly
+    temperature = max(np.ptp(positions[:, 0]), np.ptp(positions[:, 1])) * 0.1
+    cooling = temperature / (iterations + 1)
+    moving = np.arange(num_nodes) if fixed is None else np.flatnonzero(~np.asarray(fixed, dtype=bool))
+    displacement = np.empty((len(moving), 3))
+    for _ in range(iterations if len(moving) else 0):
+        # Repulsion k^2 / d^2 along (p_i - p_j), written as sum_j w_ij p_i - W @ P
+        squared_norms = np.einsum('ij,ij->i', positions, positions)
+        for start in range(0, len(moving), REPULSION_BLOCK):
+            rows = moving[start:start + REPULSION_BLOCK]
+            block = positions[rows]
+            distance_sq = squared_norms[rows, np.newaxis] + squared_norms - 2.0 * block @ positions.T
+            np.clip(distance_sq, 1e-4, None, out=distance_sq)
+            repulsion = k * k / distance_sq
+            # A node does not push itself
+            repulsion[np.arange(len(rows)), rows] = 0.0
+            displacement[start:start + REPULSION_BLOCK] = block * repulsion.sum(axis=1)[:, np.newaxis] - repulsion @ positions
+
+        if len(pull_from):
+            delta = positions[pull_from] - positions[pull_to]
+            distance = np.clip(np.linalg.norm(delta, axis=1), 0.01, None)
+            force = delta * (pull_weight * distance / k)[:, np.newaxis]
+            for axis in range(3):
+                displacement[:, axis] -= np.bincount(pull_from, weights=force[:, axis], minlength=num_nodes)[moving]
+
+        length = np.linalg.norm(displacement, axis=1)
+        length = np.where(length < 0.01, 0.1, length)
+        step = displacement * (temperature / length)[:, np.newaxis]
+        positions[moving] += step
+        temperature -= cooling
+        if np.linalg.norm(step) / num_nodes < threshold:
+            break
+
+    if fixed is None:
+        # Center on the origin and scale into the unit cube
+        positions -= positions.mean(axis=0)
+        limit = np.abs(positions).max()
+        if limit > 0:
+            positions /= limit
+    return positions
+
+
+def merge_edge_weights(num_nodes, sources, targets, weights):
+    """Collapses duplicate edges, keeping the largest weight of each."""
+    codes = np.asarray(sources, dtype=np.int64) * num_nodes + np.asarray(targets, dtype=np.int64)
+    if codes.size == 0:
+        # An edgeless graph (one statement, an empty file, a single-block CFG)
+        return codes, codes.copy(), np.empty(0, dtype=np.float64)
+    order = np.lexsort((weights, codes))
+    codes, weights = codes[order], np.asarray(weights, dtype=np.float64)[order]
+    last = np.append(codes[1:] != codes[:-1], True)
+    codes, weights = codes[last], weights[last]
+    return codes // num_nodes, codes % num_nodes, weights
+
+
+# --- Multilevel Layout ---
+# Graphs smaller than this are laid out directly
+MULTILEVEL_MIN_NODES = 200
+# Coarsening stops once a level has at most this many nodes
+COARSEST_NODES = 64
+
+
+def _symmetric(sources, targets, weights):
+    keep = sources != targets
+    sources, targets, weights = sources[keep], targets[keep], weights[keep]
+    return (np.concatenate((sources, targets)), np.concatenate((targets, sources)),
+            np.concatenate((weights, weights)))
+
+
+def coarsen(num_nodes, sources, targets, weights, rng):
+    """Merges nodes pairwise, preferring each node's heaviest neighbour.
+
+    A few rounds of handshake matching (two nodes that pick each other merge) run
+    vectorized over the edge list; nodes left over are paired in index order,
+    which keeps neighbouring lines together. Returns the fine-to-coarse map and
+    the coarse graph with summed edge weights.
+    """
+    match = np.full(num_nodes, -1, dtype=np.int64)
+    pick_from, pick_to, pick_weight = _symmetric(sources, targets, weights)
+    for _ in range(3):
+        free = (match[pick_from] < 0) & (match[pick_to] < 0)
+        if not free.any():
+            break
+        from_, to, weight = pick_from[free], pick_to[free], pick_weight[free]
+        # Heaviest free neighbour first, random tie-breaking so chains don't stall
+        order = np.lexsort((-(weight + rng.rand(len(weight)) * 1e-6), from_))
+        from_, to = from_[order], to[order]
+        first = np.ones(len(from_), dtype=bool)
+        first[1:] = from_[1:] != from_[:-1]
+        proposal = np.full(num_nodes, -1, dtype=np.int64)
+        proposal[from_[first]] = to[first]
+        proposing = np.flatnonzero(proposal >= 0)
+        mutual = proposing[proposal[proposal[proposing]] == proposing]
+        match[mutual] = proposal[mutual]
+
+    left = np.flatnonzero(match < 0)
+    pairs = left[:len(left) // 2 * 2].reshape(-1, 2)
+    match[pairs[:, 0]], match[pairs[:, 1]] = pairs[:, 1], pairs[:, 0]
+    match[match < 0] = np.flatnonzero(match < 0)
+
+    representative = np.minimum(np.arange(num_nodes), match)
+    _, parent = np.unique(representative, return_inverse=True)
+    coarse_nodes = int(parent.max()) + 1
+
+    coarse_from, coarse_to = parent[sources], parent[targets]
+    keep = coarse_from != coarse_to
+    codes, inverse = np.unique(coarse_from[keep] * coarse_nodes + coarse_to[keep], return_inverse=True)
+    coarse_weights = np.bincount(inverse, weights=weights[keep], minlength=len(codes))
+    return parent, coarse_nodes, codes // coarse_nodes, codes % coarse_nodes, coarse_weights
+
+
+def spectral_layout_3d(num_nodes, sources, targets, weights, rng):
+    """Embeds a small graph with the 2nd-4th eigenvectors of its Laplacian."""
+    if num_nodes <= 4:
+        return rng.rand(num_nodes, 3)
+    adjacency = np.zeros((num_nodes, num_nodes))
+    np.add.at(adjacency, (sources, targets), weights)
+    adjacency += adjacency.T
+    # A faint all-pairs pull keeps disconnected pieces in one embedding
+    adjacency += 1e-3 * max(adjacency.max(), 1.0)
+    np.fill_diagonal(adjacency, 0.0)
+    laplacian = np.diag(adjacency.sum(axis=1)) - adjacency
+    _, vectors = np.linalg.eigh(laplacian)
+    positions = vectors[:, 1:4]
+    return positions / max(np.abs(positions).max(), 1e-12)
+
+
+def multilevel_layout_3d(num_nodes, sources, targets, weights=None, k=0.5, seed=42,
+                         coarse_iterations=50, fine_iterations=10):
+    """Coarsen, embed the coarsest level spectrally, then interpolate and refine.
+
+    Each finer level starts from its parent's position and only needs a few
+    spring iterations, so long files converge to a better layout than a single
+    random-start spring layout in a fraction of the all-pairs work.
+    """
+    rng = np.random.RandomState(seed)
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    weights = np.ones(len(sources)) if weights is None else np.asarray(weights, dtype=np.float64)
+
+    levels = []
+    n, level_sources, level_targets, level_weights = num_nodes, sources, targets, weights
+    while n > COARSEST_NODES:
+        parent, coarse_n, coarse_sources, coarse_targets, coarse_weights = coarsen(
+            n, level_sources, level_targets, level_weights, rng)
+        levels.append((n, level_sources, level_targets, level_weights, parent))
+        n, level_sources, level_targets, level_weights = coarse_n, coarse_sources, coarse_targets, coarse_weights
+
+    positions = spectral_layout_3d(n, level_sources, level_targets, level_weights, rng)
+    positions = spring_layout_3d(n, level_sources, level_targets, level_weights, pos=positions,
+                                 k=k, iterations=coarse_iterations, seed=seed)
+    for n, level_sources, level_targets, level_weights, parent in reversed(levels):
+        # Children start on their parent, nudged apart so repulsion can separate them
+        positions = positions[parent] + (rng.rand(n, 3) - 0.5) * (k * 0.1)
+        positions = spring_layout_3d(n, level_sources, level_targets, level_weights, pos=positions,
+                                     k=k, iterations=fine_iterations, seed=seed)
+    return positions
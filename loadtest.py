@@ -0,0 +1,258 @@
+import argparse
+import glob
+import json
+import math
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+DEFAULT_URL = 'http://127.0.0.1:5001'
+
+# --- Workload ---
+def synthetic_program(index, num_functions):
+    """A deterministic program of branching, looping functions, about 9 lines each."""
+    rng = random.Random(index)
+    lines = [f'# synthetic program {index}']
+    for f in range(num_functions):
+        lines += [
+            f'def func_{f}(n):',
+            f'    total = {rng.randint(0, 9)}',
+            '    for i in range(n):',
+            f'        if i % {rng.randint(2, 5)} == 0:',
+            f'            total += i * {rng.randint(1, 9)}',
+            '        else:',
+            f'            total -= {rng.randint(1, 3)}',
+            f'    return total + (func_{f - 1}(n // 2) if n else 0)' if f else '    return total',
+            '',
+        ]
+    lines += [
+        "results = [fn(8) for name, fn in list(globals().items()) if name.startswith('func_')]",
+        'print(sum(results))',
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def load_workloads(examples_dir, synthetic, synthetic_functions):
+    workloads = []
+    for path in sorted(glob.glob(os.path.join(examples_dir, '*.py'))) if examples_dir else []:
+        with open(path, encoding='utf-8') as f:
+            workloads.append((os.path.basename(path), f.read()))
+    for index in range(synthetic):
+        workloads.append((f'synthetic-{index}', synthetic_program(index, synthetic_functions)))
+    return workloads
+
+
+# --- HTTP Client ---
+def post_json(url, payload, timeout):
+    body = json.dumps(payload).encode('utf-8')
+    req = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return response.status, response.read()
+
+
+def get_json(url, timeout):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def timed_request(url, payload, timeout):
+    """Returns (latency seconds, 'ok' | 'error' | 'timeout', detail)."""
+    started = time.perf_counter()
+    try:
+        status, body = post_json(url, payload, timeout)
+        outcome, detail = 'ok', len(body)
+    except urllib.error.HTTPError as e:
+        outcome, detail = 'error', f'HTTP {e.code}'
+    except urllib.error.URLError as e:
+        timed_out = isinstance(e.reason, (socket.timeout, TimeoutError))
+        outcome, detail = ('timeout' if timed_out else 'error'), str(e.reason)
+    except (socket.timeout, TimeoutError):
+        outcome, detail = 'timeout', 'timed out'
+    except OSError as e:
+        outcome, detail = 'error', str(e)
+    return time.perf_counter() - started, outcome, detail
+
+
+# --- Load Generation ---
+def run_load(base_url, workloads, options, concurrency, duration, max_requests, timeout, unique, seed):
+    """Keeps `concurrency` requests in flight until the duration or request count runs out."""
+    url = f'{base_url}/api/generate_graph'
+    samples = []
+    issued = [0]
+    issued_lock = threading.Lock()
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+
+    def worker(worker_id):
+        rng = random.Random(seed * 1000 + worker_id)
+        while deadline is None or time.perf_counter() < deadline:
+            with issued_lock:
+                if max_requests and issued[0] >= max_requests:
+                    return
+                issued[0] += 1
+                number = issued[0]
+            name, code = rng.choice(workloads)
+            if unique:
+                # A distinct source per request, so the server's response cache never hits
+                code = f'{code}# request {seed}-{number}\n'
+            offset = time.perf_counter() - started
+            latency, outcome, detail = timed_request(url, dict(options, code=code), timeout)
+            samples.append({"name": name, "start": offset, "latency": latency,
+                            "outcome": outcome, "detail": detail})
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def sample_memory(base_url, interval, stop, timeline):
+    """Polls /api/health for the server's resident memory until `stop` is set."""
+    started = time.perf_counter()
+    while True:
+        try:
+            health = get_json(f'{base_url}/api/health', timeout=max(interval, 1.0))
+            timeline.append([round(time.perf_counter() - started, 3), health.get('rss_bytes')])
+        except (OSError, ValueError):
+            # An older server without /api/health, or one too busy to answer in time
+            pass
+        if stop.wait(interval):
+            return
+
+
+# --- Report ---
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    # The smallest value with at least `fraction` of the samples at or below it; the
+    # epsilon keeps float error (0.07 * 100 = 7.000000000000001) from moving up a rank
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values) - 1e-9) - 1))
+    return sorted_values[rank]
+
+
+def latency_summary(samples):
+    latencies = sorted(sample["latency"] * 1000 for sample in samples if sample["outcome"] == 'ok')
+    return {
+        "requests": len(samples),
+        "ok": len(latencies),
+        "errors": sum(sample["outcome"] == 'error' for sample in samples),
+        "timeouts": sum(sample["outcome"] == 'timeout' for sample in samples),
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "max_ms": latencies[-1] if latencies else None,
+    }
+
+
+def summarize(samples, elapsed, concurrency, rss_timeline):
+    summary = latency_summary(samples)
+    summary.update(
+        concurrency=concurrency,
+        seconds=round(elapsed, 3),
+        throughput=round(summary["ok"] / elapsed, 3) if elapsed else None,
+        workloads={name: latency_summary([s for s in samples if s["name"] == name])
+                   for name in sorted({sample["name"] for sample in samples})},
+    )
+    rss = [value for _, value in rss_timeline if value is not None]
+    summary["rss_bytes"] = {"start": rss[0], "peak": max(rss), "end": rss[-1]} if rss else None
+    summary["rss_timeline"] = rss_timeline
+    return summary
+
+
+def format_ms(value):
+    return '-' if value is None else f'{value:.1f}'
+
+
+def print_report(summary, baseline=None, out=sys.stdout):
+    print(f"{summary['requests']} requests in {summary['seconds']:.1f}s at concurrency {summary['concurrency']}: "
+          f"{summary['throughput']:.2f} req/s, {summary['errors']} errors, {summary['timeouts']} timeouts", file=out)
+    print(f"latency ms  p50 {format_ms(summary['p50_ms'])}  p95 {format_ms(summary['p95_ms'])}  "
+          f"p99 {format_ms(summary['p99_ms'])}  max {format_ms(summary['max_ms'])}", file=out)
+    print(f"{'workload':<28}{'requests':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}", file=out)
+    for name, stats in summary["workloads"].items():
+        print(f"{name:<28}{stats['requests']:>9}{format_ms(stats['p50_ms']):>9}{format_ms(stats['p95_ms']):>9}"
+              f"{format_ms(stats['p99_ms']):>9}{stats['errors'] + stats['timeouts']:>8}", file=out)
+    rss = summary["rss_bytes"]
+    if rss:
+        print(f"server RSS MB  start {rss['start'] / 2**20:.1f}  peak {rss['peak'] / 2**20:.1f}  "
+              f"end {rss['end'] / 2**20:.1f}", file=out)
+    else:
+        print("server RSS unavailable (no /api/health)", file=out)
+
+    if baseline:
+        # Before/after comparison against a report saved with --json
+        print("change vs baseline:", file=out)
+        for key in ('throughput', 'p50_ms', 'p95_ms', 'p99_ms'):
+            before, after = baseline.get(key), summary.get(key)
+            if before and after is not None:
+                print(f"  {key:<11}{before:>10.2f} -> {after:>10.2f}  ({(after - before) / before:+.1%})", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Drive a local Holodeck server with concurrent /api/generate_graph requests.")
+    parser.add_argument('--url', default=DEFAULT_URL, help=f"Server base URL (default: {DEFAULT_URL})")
+    parser.add_argument('--concurrency', type=int, default=4, help="Requests kept in flight (default: 4)")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds to run; 0 for no limit (default: 30)")
+    parser.add_argument('--requests', type=int, default=0, help="Stop after this many requests (default: no limit)")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Per-request timeout in seconds (default: 30)")
+    parser.add_argument('--examples', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'examples'),
+                        help="Directory of .py files to send; '' to skip (default: examples/)")
+    parser.add_argument('--synthetic', type=int, default=2, help="Synthetic large programs in the mix (default: 2)")
+    parser.add_argument('--synthetic-functions', type=int, default=60,
+                        help="Functions per synthetic program, about 9 lines each (default: 60)")
+    parser.add_argument('--mode', choices=('lines', 'cfg'), default='lines', help="Graph mode (default: lines)")
+    parser.add_argument('--weighted-layout', action='store_true', help="Request weighted layouts")
+    parser.add_argument('--unique', action='store_true', help="Make every source distinct to bypass the response cache")
+    parser.add_argument('--rss-interval', type=float, default=1.0, help="Seconds between RSS samples (default: 1)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the request mix (default: 0)")
+    parser.add_argument('--json', help="Also write the full report, RSS timeline included, to this file")
+    parser.add_argument('--baseline', help="A report written by --json to compare against")
+    args = parser.parse_args(argv)
+
+    if not args.duration and not args.requests:
+        parser.error("pass a --duration or a --requests limit")
+    workloads = load_workloads(args.examples, args.synthetic, args.synthetic_functions)
+    if not workloads:
+        parser.error("no workloads: no examples found and --synthetic is 0")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    base_url = args.url.rstrip('/')
+    try:
+        get_json(f'{base_url}/api/health', timeout=5)
+    except (OSError, ValueError) as e:
+        print(f"warning: {base_url}/api/health did not answer ({e}); is the server running?", file=sys.stderr)
+
+    options = {'mode': args.mode, 'weighted_layout': args.weighted_layout}
+    rss_timeline = []
+    stop = threading.Event()
+    sampler = threading.Thread(target=sample_memory, args=(base_url, args.rss_interval, stop, rss_timeline),
+                               daemon=True)
+    sampler.start()
+    print(f"Sending {len(workloads)} workloads to {base_url} with concurrency {args.concurrency}...", file=sys.stderr)
+    samples, elapsed = run_load(base_url, workloads, options, max(1, args.concurrency), args.duration,
+                                args.requests, args.timeout, args.unique, args.seed)
+    stop.set()
+    sampler.join()
+
+    summary = summarize(samples, elapsed, args.concurrency, rss_timeline)
+    print_report(summary, baseline)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    return 1 if summary["ok"] == 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
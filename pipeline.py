@@ -0,0 +1,326 @@
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from code_graph import build_code_graph, layout_3d, serialize_graph
+from cfg import build_cfg_graph, block_transitions
+from trace_analysis import (transition_edges, weighted_edges, instruction_counts, instruction_names,
+                            executable_lines, playback_frames)
+from tracer import run_trace_detailed, trace_input, OPCODE_FIELD_BITS
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GRAPH_MODES = ('lines', 'cfg')
+# Options that change the response; anything else in a request is ignored by the cache
+RESPONSE_OPTIONS = {'mode': 'lines', 'weighted_layout': False, 'async_tasks': False, 'memory': False,
+                    'opcodes': False, 'frames': 0}
+# Responses carrying per-step data that a playback summary replaces with frames
+STEP_FIELDS = ('trace', 'line_trace', 'trace_threads', 'trace_tasks')
+
+# --- Graph Response Pipeline ---
+def response_options(data):
+    """Pulls the response-shaping options out of a request body, with defaults."""
+    options = {name: data.get(name, default) for name, default in RESPONSE_OPTIONS.items()}
+    options['weighted_layout'] = bool(options['weighted_layout'])
+    options['async_tasks'] = bool(options['async_tasks'])
+    options['memory'] = bool(options['memory'])
+    options['opcodes'] = bool(options['opcodes'])
+    try:
+        options['frames'] = int(options['frames'] or 0)
+    except (TypeError, ValueError):
+        options['frames'] = -1
+    if options['frames'] < 0:
+        raise ValueError("'frames' must be a non-negative integer.")
+    if options['mode'] not in GRAPH_MODES:
+        raise ValueError("'mode' must be 'lines' or 'cfg'.")
+    return options
+
+
+def build_graph_response(code, mode='lines', weighted_layout=False, async_tasks=False, memory=False, opcodes=False,
+                         frames=0, analyzer=None):
+    """Runs the whole pipeline and returns the /api/generate_graph response body."""
+    # 1. Generate Execution Trace. Steps carry the thread (and asyncio task) they ran
+    # in, so transitions are only counted between steps of the same one.
+    result = run_trace_detailed(code, async_tasks=async_tasks, memory=memory, opcodes=opcodes)
+    trace = result.lines.tolist()
+    groups = result.step_groups()
+
+    # 2. Generate Graph, weighting the edges by how often the trace took them.
+    # Live editing sessions only re-parse the top-level statements that changed.
+    line_trace = None
+    if mode == 'cfg':
+        graph = build_cfg_graph(code)
+        # The animation steps through blocks, so the trace becomes block ids
+        steps, groups, transitions = block_transitions(graph, trace, groups)
+        line_trace, trace = trace, graph.ids[steps].tolist()
+        pos = layout_3d(graph, transitions if weighted_layout else None)
+    elif analyzer:
+        with analyzer.lock:
+            graph = analyzer.update(code)
+            transitions = transition_edges(graph, trace, groups)
+            pos = analyzer.layout(graph, transitions if weighted_layout else None)
+    else:
+        graph = build_code_graph(code)
+        transitions = transition_edges(graph, trace, groups)
+        pos = layout_3d(graph, transitions if weighted_layout else None)
+    traversals = weighted_edges(graph, transitions)
+
+    # 3. Format Graph Data for Frontend
+    nodes, edges = serialize_graph(graph, pos)
+
+    # 4. Combine the response
+    response_data = {
+        "graph": {"nodes": nodes, "edges": edges, "weighted_edges": traversals},
+        "trace": trace
+    }
+    if analyzer:
+        response_data["incremental"] = analyzer.stats
+    if line_trace is not None:
+        response_data["line_trace"] = line_trace
+    if result.memory is not None:
+        response_data["memory"] = node_memory(graph, result.memory)
+    if result.opcodes is not None:
+        response_data["opcodes"] = node_instructions(graph, result.opcodes)
+    if groups is not None:
+        threads, tasks = result.split_groups(groups)
+        if len(result.threads) > 1:
+            response_data["trace_threads"] = threads.tolist()
+            response_data["threads"] = split_trace(result.threads, trace, threads)
+        if tasks is not None:
+            response_data["trace_tasks"] = tasks.tolist()
+            response_data["tasks"] = task_timelines(result, trace, tasks)
+    return apply_playback(response_data, frames) if frames else response_data
+
+
+def apply_playback(response_data, frames):
+    """Replaces a long trace with a playback summary of at most `frames` frames.
+
+    The summarized "trace" holds one node per frame, so the animation loop plays it
+    unchanged; "playback" maps each frame back to its [start, end) range of raw
+    steps, which /api/trace_slice serves on demand. Shorter traces are left alone.
+    """
+    trace = response_data["trace"]
+    if len(trace) <= frames:
+        return response_data
+    summary = dict(playback_frames(trace, frames), length=len(trace))
+    response_data = {name: value for name, value in response_data.items() if name not in STEP_FIELDS}
+    # Per-thread and per-task traces are as long as the raw one, so only their metadata stays
+    for name in ('threads', 'tasks'):
+        if name in response_data:
+            response_data[name] = [{key: value for key, value in entry.items() if key != 'trace'}
+                                   for entry in response_data[name]]
+    response_data["trace"] = summary["nodes"]
+    response_data["playback"] = summary
+    return response_data
+
+
+def step_arrays(response_data):
+    """The per-step fields of a full response, packed as arrays for slicing later."""
+    return {name: np.asarray(response_data[name], dtype=np.int32)
+            for name in STEP_FIELDS if name in response_data}
+
+
+def node_memory(graph, memory):
+    """Sums net bytes and takes the largest peak over each node's lines.
+
+    The arrays line up with the response's node list, so the frontend can scale or
+    color node i by `net[i]` or `peak[i]`.
+    """
+    net = np.zeros(graph.num_nodes, dtype=np.int64)
+    peak = np.zeros(graph.num_nodes, dtype=np.int64)
+    for values, combine in ((memory["net"], np.add), (memory["peak"], np.maximum)):
+        if values:
+            lines = np.fromiter(values.keys(), dtype=np.int64, count=len(values))
+            sizes = np.fromiter(values.values(), dtype=np.int64, count=len(values))
+            nodes = graph.nodes_for_lines(lines)
+            combine.at(net if combine is np.add else peak, nodes[nodes >= 0], sizes[nodes >= 0])
+    return {"net": net.tolist(), "peak": peak.tolist(), "truncated": memory["truncated"]}
+
+
+def node_instructions(graph, opcodes):
+    """Instructions executed per node, aligned with the node list, plus the hottest ones."""
+    lines, line_counts, hot = instruction_counts(opcodes["events"], field_bits=OPCODE_FIELD_BITS)
+    counts = np.zeros(graph.num_nodes, dtype=np.int64)
+    nodes = graph.nodes_for_lines(lines)
+    np.add.at(counts, nodes[nodes >= 0], line_counts[nodes >= 0])
+    codes = opcodes["codes"]
+    names = instruction_names({index: codes[index] for index, _, _, _ in hot})
+    return {
+        "counts": counts.tolist(),
+        "hot": [{"line": line, "offset": offset, "function": codes[index].co_qualname,
+                 "op": names.get((index, offset)), "count": count}
+                for index, line, offset, count in hot],
+        "total": len(opcodes["events"]),
+        "truncated": opcodes["truncated"],
+    }
+
+
+def split_trace(entries, trace, step_owners):
+    """Gives each thread or task entry the part of the merged trace it ran."""
+    trace = np.asarray(trace)
+    return [dict(entry, trace=trace[step_owners == index].tolist()) for index, entry in enumerate(entries)]
+
+
+def task_timelines(result, trace, step_tasks):
+    """Per-task timelines with their times converted to microseconds."""
+    timelines = split_trace(result.task_timelines(), trace, step_tasks)
+    for timeline in timelines:
+        for name in ('created', 'finished'):
+            if timeline[name] is not None:
+                timeline[name] //= 1000
+        timeline["spans"] = [[start // 1000, end // 1000] for start, end in timeline["spans"]]
+    return timelines
+
+
+# --- Coverage Across Inputs ---
+MAX_COVERAGE_INPUTS = 64
+
+def coverage_inputs(data):
+    """Validates the 'inputs' list of a coverage request, filling in defaults."""
+    inputs = data.get('inputs')
+    if not isinstance(inputs, list) or not 1 <= len(inputs) <= MAX_COVERAGE_INPUTS:
+        raise ValueError(f"'inputs' must be a list of 1 to {MAX_COVERAGE_INPUTS} runs.")
+    runs = []
+    for run_input in inputs:
+        if not isinstance(run_input, dict):
+            raise ValueError("Each input must be an object with optional 'argv', 'stdin' and 'seed'.")
+        argv = run_input.get('argv', [])
+        stdin = run_input.get('stdin', '')
+        seed = run_input.get('seed')
+        # bool is an int subclass, but true/false are not seeds
+        if not isinstance(argv, list) or not isinstance(stdin, str) or not isinstance(seed, (int, type(None))) \
+                or isinstance(seed, bool):
+            raise ValueError("'argv' must be a list, 'stdin' a string and 'seed' an integer.")
+        runs.append({"argv": [str(arg) for arg in argv], "stdin": stdin, "seed": seed})
+    return runs
+
+
+def run_inputs(code, inputs, timeout=5, workers=None):
+    """Traces the script once per input, in parallel worker processes."""
+    # Spawned rather than forked: the server process has threads that may hold locks.
+    # One run per process, since each run replaces sys.argv/stdin and may leave a
+    # runaway thread behind.
+    context = multiprocessing.get_context('spawn')
+    workers = min(len(inputs), workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, max_tasks_per_child=1) as pool:
+        futures = [pool.submit(trace_input, code, run_input, timeout) for run_input in inputs]
+        return [future.result() for future in futures]
+
+
+def build_coverage_response(code, inputs, weighted_layout=False, workers=None):
+    """Merges line hits and edge coverage of many runs onto one line graph."""
+    graph = build_code_graph(code)
+    runs = run_inputs(code, inputs, workers=workers)
+
+    n = graph.num_nodes
+    hits = np.zeros(n, dtype=np.int64)
+    runs_hit = np.zeros(n, dtype=np.int64)
+    pair_codes, pair_counts = [], []
+    for run in runs:
+        nodes = graph.nodes_for_lines(run["lines"])
+        inside = nodes >= 0
+        np.add.at(hits, nodes[inside], run["hits"][inside])
+        runs_hit[nodes[inside]] += 1
+        sources = graph.nodes_for_lines(run["pairs"][:, 0])
+        targets = graph.nodes_for_lines(run["pairs"][:, 1])
+        inside = (sources >= 0) & (targets >= 0)
+        pair_codes.append(sources[inside] * n + targets[inside])
+        pair_counts.append(run["pair_counts"][inside])
+
+    # Sum the transition counts of all runs, and count the runs that took each edge
+    codes = np.concatenate(pair_codes) if pair_codes else np.empty(0, dtype=np.int64)
+    unique_codes, inverse = np.unique(codes, return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate(pair_counts) if pair_counts else None,
+                         minlength=len(unique_codes)).astype(np.int64)
+    edge_runs = np.bincount(inverse, minlength=len(unique_codes))
+    transitions = (unique_codes // max(n, 1), unique_codes % max(n, 1), counts)
+
+    pos = layout_3d(graph, transitions if weighted_layout else None)
+    nodes, edges = serialize_graph(graph, pos)
+    traversals = weighted_edges(graph, transitions)
+    runs_by_edge = dict(zip(zip(graph.ids[transitions[0]].tolist(), graph.ids[transitions[1]].tolist()),
+                            edge_runs.tolist()))
+    for edge in traversals:
+        edge["runs"] = runs_by_edge.get((edge["source"], edge["target"]), 0)
+
+    executable = executable_lines(code)
+    covered = set(graph.ids[hits > 0].tolist())
+    return {
+        "graph": {"nodes": nodes, "edges": edges, "weighted_edges": traversals},
+        "coverage": {
+            "hits": hits.tolist(),
+            "runs_hit": runs_hit.tolist(),
+            "uncovered_lines": [line for line in executable if line not in covered],
+            "executable_lines": len(executable),
+        },
+        "runs": [
+            {"steps": run["steps"], "error": run["error"], "output": run["output"], "seconds": run["seconds"]}
+            for run in runs
+        ],
+    }
+
+
+# --- On-Disk Response Cache ---
+def response_key(code, options):
+    """Content hash of the source and the options that shape its response."""
+    canonical = json.dumps({"code": code, "options": options}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def cache_path(cache_dir, key, encoding='identity'):
+    # Fan out by prefix so large caches don't end up in a single directory
+    suffix = COMPRESSORS[encoding][0] if encoding != 'identity' else ''
+    return os.path.join(cache_dir, key[:2], f'{key}.json{suffix}')
+
+
+def load_cached(cache_dir, key, encoding='identity'):
+    try:
+        with open(cache_path(cache_dir, key, encoding), 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def store_cached(cache_dir, key, variants):
+    """Stores a response in every encoding from encode_body."""
+    for encoding, body in variants.items():
+        path = cache_path(cache_dir, key, encoding)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so a concurrent reader never sees a partial file
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+
+# --- Compressed Responses ---
+# Content-Encoding -> (cache file suffix, compress). gzip is always available;
+# brotli and zstandard are used when installed.
+COMPRESSORS = {'gzip': ('.gz', lambda body: gzip.compress(body, compresslevel=6, mtime=0))}
+if zstandard is not None:
+    # A compressor object is not thread-safe, so each body gets its own
+    COMPRESSORS['zstd'] = ('.zst', lambda body: zstandard.ZstdCompressor(level=10).compress(body))
+if brotli is not None:
+    COMPRESSORS['br'] = ('.br', lambda body: brotli.compress(body, quality=9))
+# Preferred first when a client accepts several
+ENCODING_PREFERENCE = ('br', 'zstd', 'gzip')
+
+
+def encode_body(body):
+    """A JSON body in every available encoding, keyed by Content-Encoding.
+
+    Compressed once when the response is built, so serving it again costs no CPU.
+    """
+    variants = {'identity': body}
+    for encoding, (_, compress) in COMPRESSORS.items():
+        variants[encoding] = compress(body)
+    return variants
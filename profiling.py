@@ -0,0 +1,81 @@
+import cProfile
+import hmac
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+
+# Profiling is off unless the server is started with this set
+TOKEN_VARIABLE = 'HOLODECK_PROFILE_TOKEN'
+# Format -> (mimetype, download file name)
+PROFILE_FORMATS = {
+    'pstats': ('application/octet-stream', 'holodeck.pstats'),
+    'collapsed': ('text/plain', 'holodeck.collapsed.txt'),
+}
+SAMPLE_INTERVAL = 0.001
+
+# --- Access ---
+def profiling_allowed(token):
+    """Whether a request's token matches HOLODECK_PROFILE_TOKEN; always False when that is unset."""
+    expected = os.environ.get(TOKEN_VARIABLE)
+    if not expected or not token:
+        return False
+    return hmac.compare_digest(token.encode('utf-8'), expected.encode('utf-8'))
+
+
+# --- Profilers ---
+def pstats_profile(fn):
+    """Runs fn under cProfile; returns (its result, a file pstats.Stats and snakeviz can load)."""
+    profiler = cProfile.Profile()
+    result = profiler.runcall(fn)
+    # The same marshalled dict Stats.dump_stats writes to disk
+    return result, marshal.dumps(pstats.Stats(profiler).stats)
+
+
+def frame_name(code):
+    return f'{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def sampled_profile(fn, interval=SAMPLE_INTERVAL):
+    """Runs fn while a thread samples its stack; returns (its result, collapsed stacks).
+
+    The output is one 'outer;...;inner count' line per distinct stack, the input
+    of flamegraph.pl and speedscope. Sampling skips the tracer's worker thread, so
+    the time spent running the user's script shows up as waiting on it.
+    """
+    ident = threading.get_ident()
+    counts = {}
+    stop = threading.Event()
+
+    def sample():
+        while not stop.wait(interval):
+            frame = sys._current_frames().get(ident)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            key = tuple(reversed(stack))
+            counts[key] = counts.get(key, 0) + 1
+
+    sampler = threading.Thread(target=sample, name='holodeck-profile-sampler', daemon=True)
+    sampler.start()
+    try:
+        result = fn()
+    finally:
+        stop.set()
+        sampler.join()
+    names = {}
+    lines = []
+    for stack, count in counts.items():
+        frames = [names.get(code) or names.setdefault(code, frame_name(code)) for code in stack]
+        lines.append(f"{';'.join(frames)} {count}\n")
+    return result, ''.join(sorted(lines)).encode('utf-8')
+
+
+def profile_call(fmt, fn):
+    """Runs fn under the profiler for `fmt`; returns (result, profile bytes, seconds)."""
+    started = time.perf_counter()
+    result, body = pstats_profile(fn) if fmt == 'pstats' else sampled_profile(fn)
+    return result, body, time.perf_counter() - started
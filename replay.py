@@ -0,0 +1,198 @@
+import builtins
+import io
+import os
+import random
+import sys
+import threading
+import time
+import types
+from tracer import run_trace_detailed
+
+REPLAY_VERSION = 1
+# Clock readings are logged; time.sleep is skipped on replay since nothing reads its result
+TIME_FUNCTIONS = ('time', 'time_ns', 'perf_counter', 'perf_counter_ns', 'monotonic', 'monotonic_ns',
+                  'process_time', 'process_time_ns', 'thread_time', 'thread_time_ns')
+# A replay skips the recorded sleeps, so it rarely needs longer than the recording
+MAX_REPLAY_TIMEOUT = 30
+# Clock readings logged per recording, so a script polling the clock can't grow its log without bound
+MAX_LOGGED_READINGS = 100_000
+_real_import = builtins.__import__
+
+
+# --- Replay Logs ---
+class ModuleProxy(types.ModuleType):
+    """A module with some attributes replaced; everything else reads and writes through."""
+
+    def __init__(self, module, overrides):
+        super().__init__(module.__name__, module.__doc__)
+        self.__dict__.update(overrides)
+        self.__dict__['_module'] = module
+
+    def __getattr__(self, name):
+        # Only reached for names that are not overridden
+        return getattr(self._module, name)
+
+    def __setattr__(self, name, value):
+        if name in self.__dict__:
+            self.__dict__[name] = value
+        else:
+            setattr(self._module, name, value)
+
+
+class ReplayLog:
+    """The nondeterministic inputs of one run, so it can be re-run into the same trace.
+
+    Recording draws a fresh random seed, logs what the time module's clock
+    functions returned and keeps the stdin text the script consumed. Replaying
+    (from the dict to_json made) seeds the same generator, hands back the logged
+    readings in order and serves the same stdin. Both reach the script through
+    its builtins: `random`, `time` and `sys` imports get proxy modules and
+    `input` reads the logged stdin. Libraries keep the real modules, and threads
+    that interleave differently between runs may still change the trace. A
+    replay that runs out of logged readings falls back to the real clock, as
+    does a recording past MAX_LOGGED_READINGS (its log is then marked
+    truncated) or one whose script outlived the recording.
+    """
+
+    def __init__(self, log=None, stdin=''):
+        self.replaying = log is not None
+        if self.replaying:
+            log = _checked_log(log)
+            self.seed = log["seed"]
+            self.times = {name: list(values) for name, values in log["time"].items()}
+            stdin = log["stdin"]
+            self.steps, self.seconds = log["steps"], log["seconds"]
+            self.truncated = log.get("truncated", False)
+        else:
+            self.seed = int.from_bytes(os.urandom(8), 'little')
+            self.times = {}
+            self.steps, self.seconds = None, None
+            self.truncated = False
+        # Set once the recording is done; a script that outlived its timeout logs nothing more
+        self.finished = False
+        self.logged = 0
+        self.stdin = io.StringIO(stdin)
+        # When the script started, and when a replay first ran out of logged readings
+        self.started_ns = None
+        self.exhausted_ns = None
+        self._positions = {}
+        self._lock = threading.Lock()
+        self.modules = {
+            'random': ModuleProxy(random, _generator_methods(random.Random(self.seed))),
+            'time': ModuleProxy(time, dict({name: self._clock(name) for name in TIME_FUNCTIONS},
+                                           sleep=self._sleep)),
+            'sys': ModuleProxy(sys, {'stdin': self.stdin}),
+        }
+
+    def _clock(self, name):
+        read = getattr(time, name)
+
+        def clock():
+            with self._lock:
+                values = self.times.setdefault(name, [])
+                if not self.replaying:
+                    if self.finished or self.truncated:
+                        return read()
+                    if self.logged >= MAX_LOGGED_READINGS:
+                        self.truncated = True
+                        return read()
+                    self.logged += 1
+                    values.append(read())
+                    return values[-1]
+                position = self._positions.get(name, 0)
+                if position < len(values):
+                    self._positions[name] = position + 1
+                    return values[position]
+                if self.exhausted_ns is None:
+                    self.exhausted_ns = time.perf_counter_ns()
+            return read()
+        return clock
+
+    def _sleep(self, seconds):
+        if not self.replaying:
+            time.sleep(seconds)
+
+    def _input(self, prompt=''):
+        if prompt:
+            print(prompt, end='', flush=True)
+        line = self.stdin.readline()
+        if not line:
+            raise EOFError('EOF when reading a line')
+        return line.rstrip('\n')
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        module = _real_import(name, globals, locals, fromlist, level)
+        if level == 0 and name in self.modules:
+            return self.modules[name]
+        return module
+
+    def script_builtins(self):
+        """The builtins an ExecutionTracer gives the script's namespace."""
+        self.started_ns = time.perf_counter_ns()
+        return dict(builtins.__dict__, __import__=self._import, input=self._input)
+
+    def to_json(self, steps, seconds):
+        """Ends the recording and returns its log."""
+        with self._lock:
+            self.finished = True
+            times = {name: list(values) for name, values in self.times.items()}
+        return {
+            "version": REPLAY_VERSION,
+            "seed": self.seed,
+            "time": times,
+            # Only what the script consumed, not the whole input it was offered
+            "stdin": self.stdin.getvalue()[:self.stdin.tell()],
+            "steps": steps,
+            "seconds": round(seconds, 3),
+            "truncated": self.truncated,
+        }
+
+
+def _generator_methods(rng):
+    # random.randint and friends are bound methods of a hidden module-level Random
+    return {name: getattr(rng, name) for name, value in vars(random).items()
+            if isinstance(getattr(value, '__self__', None), random.Random)}
+
+
+def _checked_log(log):
+    if not isinstance(log, dict) or log.get("version") != REPLAY_VERSION:
+        raise ValueError(f"'log' must be a version {REPLAY_VERSION} replay log from /api/record.")
+    times = log.get("time")
+    valid = (
+        isinstance(log.get("seed"), int) and isinstance(log.get("stdin"), str)
+        and isinstance(log.get("steps"), int) and log["steps"] >= 0
+        and isinstance(log.get("seconds"), (int, float))
+        and isinstance(log.get("truncated", False), bool)
+        and isinstance(times, dict) and all(
+            name in TIME_FUNCTIONS and isinstance(values, list)
+            and all(isinstance(value, (int, float)) for value in values)
+            for name, values in times.items())
+    )
+    if not valid:
+        raise ValueError("The replay log is malformed.")
+    return log
+
+
+# --- Record and Replay ---
+def record_trace(code, stdin='', timeout=5):
+    """Traces the script while logging its nondeterministic inputs; returns (result, log)."""
+    log = ReplayLog(stdin=stdin)
+    result = run_trace_detailed(code, timeout, replay=log)
+    return result, log.to_json(len(result.lines), result.duration / 1e9)
+
+
+def replay_trace(code, log):
+    """Re-runs a recorded script into the same trace; returns (result, diverged).
+
+    The replay stops tracing after the recorded number of steps, so a recording
+    cut off by its timeout is regenerated up to the same point. It has diverged
+    when it ran out of logged readings before its last step, or came up short.
+    """
+    replay = ReplayLog(log)
+    timeout = min(MAX_REPLAY_TIMEOUT, 2 * replay.seconds + 1)
+    result = run_trace_detailed(code, timeout, replay=replay, max_steps=replay.steps)
+    # A script cut off by the timeout goes on reading the clock untraced, past the log
+    last_step = result.timestamps[-1] if len(result.timestamps) else 0
+    diverged = len(result.lines) < replay.steps or (
+        replay.exhausted_ns is not None and replay.exhausted_ns - replay.started_ns < last_step)
+    return result, diverged
@@ -1,218 +1,629 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import ast
-import networkx as nx
+try:
+    from flask_sock import Sock
+except ImportError:
+    # Live editing sessions are optional; plain HTTP requests work without them
+    Sock = None
+import gzip
+import importlib
+import importlib.util
+import os
 import sys
 import threading
-from queue import Queue
+import time
+from collections import OrderedDict
 import json
+# The analysis modules (and numpy behind them) are imported inside the endpoints
+# that use them, so /api/health and startup stay light. Production servers load
+# them up front with preload() instead; see wsgi.py.
+
+# Responses precomputed by cli.py (or stored by an earlier run) are served from here
+CACHE_DIR = os.environ.get('HOLODECK_CACHE_DIR')
+
+# --- Live Editing Sessions ---
+MAX_SESSIONS = 64
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+
+def get_session_analyzer(session_id):
+    from incremental import IncrementalAnalyzer
+
+    with _sessions_lock:
+        analyzer = _sessions.pop(session_id, None) or IncrementalAnalyzer()
+        _sessions[session_id] = analyzer
+        # Drop the least recently used sessions
+        while len(_sessions) > MAX_SESSIONS:
+            _sessions.popitem(last=False)
+        return analyzer
+
+# --- Encoded Response Cache ---
+# Recent responses, kept compressed only and bounded by their total size
+MAX_RESPONSE_CACHE_BYTES = int(os.environ.get('HOLODECK_RESPONSE_CACHE_MB', 64)) << 20
+_responses = OrderedDict()
+_responses_size = 0
+_responses_lock = threading.Lock()
+
+def remember_response(key, variants):
+    global _responses_size
+    compressed = {encoding: body for encoding, body in variants.items() if encoding != 'identity'}
+    size = sum(map(len, compressed.values()))
+    if size > MAX_RESPONSE_CACHE_BYTES:
+        return
+    with _responses_lock:
+        previous = _responses.pop(key, None)
+        if previous:
+            _responses_size -= sum(map(len, previous.values()))
+        _responses[key] = compressed
+        _responses_size += size
+        while _responses_size > MAX_RESPONSE_CACHE_BYTES:
+            _, evicted = _responses.popitem(last=False)
+            _responses_size -= sum(map(len, evicted.values()))
+
+
+def cached_response(key, encoding):
+    """The stored body in `encoding`, from memory or CACHE_DIR; None when missing."""
+    from pipeline import load_cached, store_cached, encode_body
+
+    with _responses_lock:
+        variants = _responses.get(key)
+        if variants is not None:
+            _responses.move_to_end(key)
+    if variants is not None:
+        # Clients that accept no compression are rare enough to decompress for
+        return variants[encoding] if encoding != 'identity' else gzip.decompress(variants['gzip'])
+    if not CACHE_DIR:
+        return None
+    body = load_cached(CACHE_DIR, key, encoding)
+    if body is None and encoding != 'identity':
+        # An entry written before compression, or by a server without this encoding
+        body = load_cached(CACHE_DIR, key)
+        if body is not None:
+            variants = encode_body(body)
+            store_cached(CACHE_DIR, key, variants)
+            body = variants[encoding]
+    return body
+
+
+def negotiate_encoding(accept_encodings):
+    from pipeline import COMPRESSORS, ENCODING_PREFERENCE
+
+    for encoding in ENCODING_PREFERENCE:
+        if encoding in COMPRESSORS and accept_encodings[encoding] > 0:
+            return encoding
+    return 'identity'
+
+
+def encoded_response(body, encoding, etag, status=200):
+    response = Response(body, status=status, mimetype='application/json')
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    if encoding != 'identity' and body is not None:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+# --- Raw Traces Behind Playback Summaries ---
+MAX_RAW_TRACES = 8
+MAX_SLICE_STEPS = 100_000
+_raw_traces = OrderedDict()
+_raw_traces_lock = threading.Lock()
+
+def remember_steps(key, steps):
+    with _raw_traces_lock:
+        _raw_traces.pop(key, None)
+        _raw_traces[key] = steps
+        while len(_raw_traces) > MAX_RAW_TRACES:
+            _raw_traces.popitem(last=False)
 
-# --- AST and Graph Generation (from HoloDeck5.py) ---
-def generate_3d_network(code_string):
-    try:
-        tree = ast.parse(code_string)
-    except SyntaxError as e:
-        # Re-raise with more context for the frontend
-        raise SyntaxError(f"Error parsing Python code on line {e.lineno}: {e.text.strip()}\n{e.msg}")
-
-    graph = nx.DiGraph()
-    code_lines = code_string.splitlines()
-
-    # Add all lines as nodes first, without a type
-    for i, line in enumerate(code_lines):
-        graph.add_node(i + 1, code=line.strip())
-
-    class NetworkVisitor(ast.NodeVisitor):
-        def __init__(self, graph):
-            self.graph = graph
-            self.line_map = {i + 1: line.strip() for i, line in enumerate(code_lines)}
-            self.node_types = {}
-            self.type_priority = {
-                'definition': 6,
-                'control_flow': 5,
-                'function_call': 4,
-                'operation': 3,
-                'data_change': 2,
-                'literal': 1
-            }
-
-        def visit(self, node):
-            if hasattr(node, 'lineno'):
-                line_no = node.lineno
-                node_type = self.get_node_type(node)
-                if node_type:
-                    current_priority = self.type_priority.get(self.node_types.get(line_no), 0)
-                    new_priority = self.type_priority.get(node_type, 0)
-                    if new_priority > current_priority:
-                        self.node_types[line_no] = node_type
-            self.generic_visit(node)
-
-        def visit_body(self, body_nodes, parent_lineno):
-            prev_lineno = parent_lineno
-            for node in body_nodes:
-                if not hasattr(node, 'lineno'): continue
-                # self.visit(node) # This is already called by generic_visit in the main traversal
-                # Ensure both source and target nodes exist before adding an edge
-                if self.graph.has_node(prev_lineno) and self.graph.has_node(node.lineno):
-                    self.graph.add_edge(prev_lineno, node.lineno)
-                prev_lineno = node.lineno
-            return prev_lineno
-
-        def get_node_type(self, node):
-            """Categorizes an AST node into one of our 6 types."""
-            if isinstance(node, (ast.FunctionDef, ast.ClassDef, ast.Import, ast.ImportFrom)):
-                return 'definition'
-            if isinstance(node, (ast.If, ast.For, ast.While, ast.Try, ast.Return, ast.Break, ast.Continue)):
-                return 'control_flow'
-            if isinstance(node, ast.Call):
-                return 'function_call'
-            if isinstance(node, (ast.Assign, ast.AugAssign, ast.List, ast.Dict, ast.Tuple, ast.Set)):
-                return 'data_change'
-            if isinstance(node, (ast.BinOp, ast.Compare, ast.BoolOp, ast.UnaryOp)):
-                return 'operation'
-            if isinstance(node, ast.Constant):
-                return 'literal'
-            return None
-
-        def visit_FunctionDef(self, node):
-            self.visit_body(node.body, node.lineno)
-            self.generic_visit(node)
-
-        def visit_For(self, node):
-            last_body_node_lineno = self.visit_body(node.body, node.lineno)
-            # Edge from end of loop back to the start
-            if self.graph.has_node(last_body_node_lineno) and self.graph.has_node(node.lineno):
-                 self.graph.add_edge(last_body_node_lineno, node.lineno)
-            self.generic_visit(node)
-
-        def visit_While(self, node):
-            last_body_node_lineno = self.visit_body(node.body, node.lineno)
-            # Edge from end of loop back to the start
-            if self.graph.has_node(last_body_node_lineno) and self.graph.has_node(node.lineno):
-                 self.graph.add_edge(last_body_node_lineno, node.lineno)
-            self.generic_visit(node)
-
-        def visit_If(self, node):
-            self.visit_body(node.body, node.lineno)
-            if node.orelse:
-                self.visit_body(node.orelse, node.lineno)
-            self.generic_visit(node)
-
-    visitor = NetworkVisitor(graph)
-    visitor.visit(tree)
-    visitor.visit_body(tree.body, 0) # Explicitly visit the top-level body
-
-    # Update the nodes with the determined type
-    for line_no, node_type in visitor.node_types.items():
-        if line_no in graph.nodes:
-            graph.nodes[line_no]['type'] = node_type
-
-    # Use a 3D spring layout
-    pos_3d = nx.spring_layout(graph, dim=3, seed=42, k=0.5, iterations=50)
-    return graph, pos_3d
-
-# --- Execution Tracing (from HoloDeck5.py) ---
-class ExecutionTracer:
-    def __init__(self, code, queue):
-        self.code = code
-        self.queue = queue
-        self.executed_lines = set()
-
-    def trace_function(self, frame, event, arg):
-        # We only care about the 'line' event
-        if event == 'line':
-            lineno = frame.f_lineno
-            # To avoid infinite loops in tracing, limit to a reasonable number of total trace steps
-            if len(self.executed_lines) < 200:
-                self.queue.put(lineno)
-                self.executed_lines.add(lineno)
-        return self.trace_function
-
-    def run_code(self):
-        # Set the trace function for the current thread
-        sys.settrace(self.trace_function)
-        try:
-            # Execute the user's code in a restricted scope
-            exec(self.code, {"__name__": "__main__"})
-        except Exception as e:
-            print(f"Error during traced execution: {e}")
-        finally:
-            # Always remove the trace function
-            sys.settrace(None)
-            self.queue.put(None) # Signal that tracing is finished
+
+def raw_steps(code, options):
+    """The per-step arrays of the full trace, re-traced if they were evicted.
+
+    A re-run only matches the summary the client holds when the script is
+    deterministic; scripts reading the clock or unseeded randomness may differ.
+    """
+    from pipeline import build_graph_response, response_key, step_arrays
+
+    key = response_key(code, dict(options, frames=0))
+    with _raw_traces_lock:
+        steps = _raw_traces.get(key)
+        if steps is not None:
+            _raw_traces.move_to_end(key)
+            return steps
+    steps = step_arrays(build_graph_response(code, **dict(options, frames=0)))
+    remember_steps(key, steps)
+    return steps
+
+# --- Spatial Indexes for Viewport Queries ---
+MAX_GRAPH_INDEXES = 16
+_graph_indexes = OrderedDict()
+_graph_indexes_lock = threading.Lock()
+
+def graph_index(code, options):
+    """The spatial index over a graph's layout, built from its cached response when possible."""
+    from pipeline import build_graph_response, response_key
+    from spatial import GraphIndex
+
+    key = response_key(code, options)
+    with _graph_indexes_lock:
+        index = _graph_indexes.get(key)
+        if index is not None:
+            _graph_indexes.move_to_end(key)
+            return index
+    body = cached_response(key, 'identity')
+    graph = json.loads(body)["graph"] if body is not None else build_graph_response(code, **options)["graph"]
+    index = GraphIndex(graph["nodes"], graph["edges"])
+    with _graph_indexes_lock:
+        _graph_indexes[key] = index
+        while len(_graph_indexes) > MAX_GRAPH_INDEXES:
+            _graph_indexes.popitem(last=False)
+    return index
+
+# --- Preloading ---
+# Import order follows the dependencies, so each timing is mostly that module's own cost
+PRELOAD_MODULES = ('numpy', 'graph_core', 'layout', 'code_graph', 'trace_analysis', 'cfg', 'tracer',
+                   'incremental', 'pipeline', 'spatial', 'export', 'replay', 'profiling')
+WARM_UP_CODE = '''
+def square(n):
+    return n * n
+
+total = 0
+for i in range(20):
+    if i % 3:
+        total += square(i)
+'''
+startup_report = None
+
+def preload(out=sys.stdout):
+    """Imports the analysis modules and runs one small script through each graph mode.
+
+    Called before a multi-worker server forks, so every worker shares the loaded
+    modules copy-on-write instead of paying for them on its first request.
+    Prints and returns the per-module import and warm-up times in milliseconds.
+    """
+    global startup_report
+    imports = {}
+    for name in PRELOAD_MODULES:
+        started = time.perf_counter()
+        importlib.import_module(name)
+        imports[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    from pipeline import build_graph_response
+    warm_up = {}
+    for mode in ('lines', 'cfg'):
+        started = time.perf_counter()
+        build_graph_response(WARM_UP_CODE, mode=mode)
+        warm_up[mode] = round((time.perf_counter() - started) * 1000, 1)
+
+    startup_report = {"imports_ms": imports, "warm_up_ms": warm_up}
+    print(f"Preloaded in {sum(imports.values()) + sum(warm_up.values()):.0f} ms:", file=out)
+    for name, ms in imports.items():
+        print(f"  import {name:<16}{ms:>8.1f} ms", file=out)
+    for mode, ms in warm_up.items():
+        print(f"  warm-up {mode:<15}{ms:>8.1f} ms", file=out)
+    return startup_report
+
+# --- Health ---
+STARTED_AT = time.monotonic()
+
+def resident_memory():
+    """Current resident set size in bytes; the peak where /proc is missing, None on Windows."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
 
 # --- Flask App ---
 app = Flask(__name__)
-CORS(app) # Enable Cross-Origin Resource Sharing for local development
+CORS(app, expose_headers=['ETag', 'X-Profile-Seconds']) # Enable Cross-Origin Resource Sharing for local development
 
 @app.route('/api/generate_graph', methods=['POST'])
 def generate_graph_endpoint():
+    from pipeline import (build_graph_response, response_options, response_key, store_cached, encode_body,
+                          apply_playback, step_arrays)
+
     data = request.get_json()
     if not data or 'code' not in data:
-        return jsonify({"error": "Invalid request. 'code' field is required."}),
-    
+        return jsonify({"error": "Invalid request. 'code' field is required."}), 400
+
     code = data['code']
+    session_id = data.get('session_id')
+    try:
+        options = response_options(data)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid request. {e}"}), 400
+
+    if data.get('profile'):
+        return profiled_response(code, options, data['profile'])
+
+    try:
+        # Live editing sessions keep per-session state, so they bypass the cache
+        if session_id and options['mode'] == 'lines':
+            analyzer = get_session_analyzer(str(session_id))
+            return jsonify(build_graph_response(code, analyzer=analyzer, **options))
+
+        # The ETag hashes the source and options, so a client holding this
+        # response is answered before anything is traced or read from the cache
+        key = response_key(code, options)
+        encoding = negotiate_encoding(request.accept_encodings)
+        etag = key if encoding == 'identity' else f'{key}-{encoding}'
+        if request.if_none_match.contains_weak(etag):
+            return encoded_response(None, encoding, etag, status=304)
+
+        body = cached_response(key, encoding)
+        if body is None:
+            response = build_graph_response(code, **dict(options, frames=0))
+            if options['frames']:
+                # Keep the raw steps so the client can drill into any frame
+                remember_steps(response_key(code, dict(options, frames=0)), step_arrays(response))
+                response = apply_playback(response, options['frames'])
+            variants = encode_body(json.dumps(response).encode('utf-8'))
+            remember_response(key, variants)
+            if CACHE_DIR:
+                store_cached(CACHE_DIR, key, variants)
+            body = variants[encoding]
+        return encoded_response(body, encoding, etag)
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return jsonify({"error": str(e)}), 500
+
+def profiled_response(code, options, fmt):
+    """Runs the uncached pipeline under a profiler and returns the profile as a download.
+
+    'profile' is 'pstats' (cProfile) or 'collapsed' (sampled stacks for flame
+    graphs); true means 'pstats'. The X-Profile-Token header must match
+    HOLODECK_PROFILE_TOKEN, and nothing is profiled while that is unset.
+    """
+    from pipeline import build_graph_response, encode_body
+    from profiling import PROFILE_FORMATS, profiling_allowed, profile_call
+
+    if not profiling_allowed(request.headers.get('X-Profile-Token')):
+        return jsonify({"error": "Profiling needs an X-Profile-Token matching HOLODECK_PROFILE_TOKEN."}), 403
+    fmt = 'pstats' if fmt is True else fmt
+    # Lists and objects are unhashable, so check the type before looking the name up
+    if not isinstance(fmt, str) or fmt not in PROFILE_FORMATS:
+        return jsonify({"error": f"Invalid request. 'profile' must be true or one of: {', '.join(PROFILE_FORMATS)}."}), 400
+
+    try:
+        # Serializing and compressing the response are part of what a request costs
+        _, body, seconds = profile_call(
+            fmt, lambda: encode_body(json.dumps(build_graph_response(code, **options)).encode('utf-8')))
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return jsonify({"error": str(e)}), 500
+    mimetype, filename = PROFILE_FORMATS[fmt]
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Profile-Seconds': f'{seconds:.3f}',
+    })
+
+@app.route('/api/trace_slice', methods=['POST'])
+def trace_slice_endpoint():
+    """Returns raw trace steps [start, end) behind a playback summary.
+
+    The body repeats the 'code' and options of the /api/generate_graph request.
+    """
+    from pipeline import response_options
+
+    data = request.get_json()
+    if not data or 'code' not in data:
+        return jsonify({"error": "Invalid request. 'code' field is required."}), 400
 
     try:
-        # 1. Generate Graph
-        graph, pos = generate_3d_network(code)
-
-        # 2. Format Graph Data for Frontend
-        nodes = [
-            {
-                "id": int(node_id),
-                "code": graph.nodes[node_id].get('code', ''),
-                "type": graph.nodes[node_id].get('type', 'data_change'), # Pass the type
-                # Scale positions to fit the frontend's desired [-10, 10] cube
-                "position": [p * 10 for p in pos[node_id]]
-            }
-            for node_id in graph.nodes()
-        ]
-
-        edges = [
-            {"source": int(source), "target": int(target)}
-            for source, target in graph.edges()
-        ]
-
-        # 3. Generate Execution Trace
-        trace_queue = Queue()
-        tracer = ExecutionTracer(code, trace_queue)
-        # Running the trace in a separate thread to avoid blocking
-        trace_thread = threading.Thread(target=tracer.run_code, daemon=True)
-        trace_thread.start()
-        trace_thread.join(timeout=5) # Add a timeout to prevent hangs from infinite loops
-
-        trace = []
-        while not trace_queue.empty():
-            line_no = trace_queue.get()
-            if line_no is not None:
-                trace.append(line_no)
-
-        # 4. Combine and send the response
-        response_data = {
-            "graph": {"nodes": nodes, "edges": edges},
-            "trace": trace
-        }
+        options = response_options(data)
+        start, end = int(data.get('start', 0)), int(data['end'])
+    except KeyError:
+        return jsonify({"error": "Invalid request. 'end' field is required."}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid request. {e}"}), 400
+    if not 0 <= start <= end or end - start > MAX_SLICE_STEPS:
+        return jsonify({"error": f"Invalid request. Ask for 0 <= start <= end, at most {MAX_SLICE_STEPS} steps."}), 400
+
+    try:
+        steps = raw_steps(data['code'], options)
+        response_data = {name: values[start:end].tolist() for name, values in steps.items()}
+        response_data.update(start=start, end=min(end, len(steps["trace"])), length=len(steps["trace"]))
         return jsonify(response_data)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/record', methods=['POST'])
+def record_endpoint():
+    """Traces a script while logging its random seed, clock readings and stdin.
+
+    Returns the replay log instead of the trace; /api/replay regenerates any
+    window of the trace from the source and the log.
+    """
+    from replay import record_trace
+
+    data = request.get_json()
+    if not data or 'code' not in data:
+        return jsonify({"error": "Invalid request. 'code' field is required."}), 400
+    if not isinstance(data.get('stdin', ''), str):
+        return jsonify({"error": "Invalid request. 'stdin' must be a string."}), 400
 
+    try:
+        result, log = record_trace(data['code'], data.get('stdin', ''))
+        return jsonify({"log": log, "length": len(result.lines), "error": result.error})
     except Exception as e:
         print(f"An error occurred: {e}")
-        return jsonify({"error": str(e)}),
+        return jsonify({"error": str(e)}), 500
 
-if __name__ == '__main__':
-    # Add instructions to install dependencies
+@app.route('/api/replay', methods=['POST'])
+def replay_endpoint():
+    """Re-runs a recorded script and returns trace steps [start, end).
+
+    'diverged' is set when the replay could not follow the log to the end, in
+    which case the steps may differ from the recording.
+    """
+    from replay import replay_trace
+
+    data = request.get_json()
+    if not data or 'code' not in data or 'log' not in data:
+        return jsonify({"error": "Invalid request. 'code' and 'log' fields are required."}), 400
     try:
-        import networkx
-        import flask
-        import flask_cors
-        import numpy
-    except ImportError:
+        start = int(data.get('start', 0))
+        end = int(data.get('end', start + MAX_SLICE_STEPS))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid request. {e}"}), 400
+    if not 0 <= start <= end or end - start > MAX_SLICE_STEPS:
+        return jsonify({"error": f"Invalid request. Ask for 0 <= start <= end, at most {MAX_SLICE_STEPS} steps."}), 400
+
+    try:
+        result, diverged = replay_trace(data['code'], data['log'])
+    except ValueError as e:
+        return jsonify({"error": f"Invalid request. {e}"}), 400
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return jsonify({"error": str(e)}), 500
+    return jsonify({
+        "trace": result.lines[start:end].tolist(),
+        "start": start,
+        "end": min(end, len(result.lines)),
+        "length": len(result.lines),
+        "diverged": diverged,
+        "error": result.error,
+    })
+
+@app.route('/api/graph_query', methods=['POST'])
+def graph_query_endpoint():
+    """Returns only the nodes and edges of a graph that a camera can see.
+
+    The body repeats the 'code' and options of the /api/generate_graph request
+    and adds a 'box' and/or 'frustum', plus an optional 'camera' position and
+    'lod_distance' beyond which visible nodes are merged into clusters.
+    """
+    from pipeline import response_options
+    from spatial import query_bounds
+
+    data = request.get_json()
+    if not data or 'code' not in data:
+        return jsonify({"error": "Invalid request. 'code' field is required."}), 400
+
+    try:
+        options = response_options(data)
+        planes, camera, lod_distance = query_bounds(data)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid request. {e}"}), 400
+
+    try:
+        return jsonify(graph_index(data['code'], options).query(planes, camera, lod_distance))
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/export/<fmt>', methods=['POST'])
+def export_endpoint(fmt):
+    """Streams the script's trace as a Chrome Trace Event ('chrome') or speedscope file."""
+    from export import EXPORT_FORMATS, export_trace
+
+    data = request.get_json()
+    if not data or 'code' not in data:
+        return jsonify({"error": "Invalid request. 'code' field is required."}), 400
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"Unknown export format. Use one of: {', '.join(EXPORT_FORMATS)}."}), 404
+
+    try:
+        chunks = export_trace(data['code'], fmt)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return jsonify({"error": str(e)}), 500
+    # Written out while it is being generated, never held whole in memory
+    filename = f'holodeck{EXPORT_FORMATS[fmt][1]}'
+    return Response(chunks, mimetype='application/json',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+# --- Trace Diffs ---
+# Loop folding and alignment grow with both, so clients only get to lower them
+MAX_DIFF_PERIOD = 64
+MAX_DIFF_EDITS = 20_000
+# Past anything a source file has; traces pack line numbers into 32 bits
+MAX_LINE_NUMBER = (1 << 31) - 1
+
+def diff_limit(data, name, default, maximum):
+    value = data.get(name, default)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError(f"'{name}' must be an integer.")
+    return max(1, min(value, maximum))
+
+def check_recorded_trace(data, name):
+    trace = data[name]
+    if not isinstance(trace, list) or not all(
+            isinstance(line_no, int) and not isinstance(line_no, bool) and 0 <= line_no <= MAX_LINE_NUMBER
+            for line_no in trace):
+        raise ValueError(f"'{name}' must be a list of line numbers from 0 to {MAX_LINE_NUMBER}.")
+
+@app.route('/api/diff_traces', methods=['POST'])
+def diff_traces_endpoint():
+    from trace_analysis import diff_traces
+    from tracer import run_trace
+
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Invalid request. Send 'trace_a'/'trace_b' or 'code_a'/'code_b'."}), 400
+
+    try:
+        max_period = diff_limit(data, 'max_period', 16, MAX_DIFF_PERIOD)
+        max_edits = diff_limit(data, 'max_edits', 2000, MAX_DIFF_EDITS)
+        for side in ('a', 'b'):
+            if f'trace_{side}' in data:
+                check_recorded_trace(data, f'trace_{side}')
+            elif not isinstance(data.get(f'code_{side}'), str):
+                raise ValueError(f"Send 'trace_{side}' or a 'code_{side}' string.")
+    except ValueError as e:
+        return jsonify({"error": f"Invalid request. {e}"}), 400
+
+    try:
+        # Either compare two recorded traces or trace both scripts here
+        traces = [data[f'trace_{side}'] if f'trace_{side}' in data else run_trace(data[f'code_{side}'])
+                  for side in ('a', 'b')]
+        result = diff_traces(traces[0], traces[1], max_period=max_period, max_edits=max_edits)
+        result["lengths"] = [len(traces[0]), len(traces[1])]
+        return jsonify(result)
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/coverage', methods=['POST'])
+def coverage_endpoint():
+    """Runs a script once per input and returns the merged line and edge coverage.
+
+    Each input is {"argv": [...], "stdin": "...", "seed": n}, all optional.
+    """
+    from pipeline import coverage_inputs, build_coverage_response
+
+    data = request.get_json()
+    if not data or 'code' not in data:
+        return jsonify({"error": "Invalid request. 'code' field is required."}), 400
+
+    try:
+        inputs = coverage_inputs(data)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid request. {e}"}), 400
+
+    try:
+        return jsonify(build_coverage_response(data['code'], inputs,
+                                               weighted_layout=bool(data.get('weighted_layout', False))))
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/health', methods=['GET'])
+def health_endpoint():
+    # Cheap enough to poll while the server is under load (see loadtest.py)
+    return jsonify({
+        "status": "ok",
+        "uptime_seconds": round(time.monotonic() - STARTED_AT, 3),
+        "rss_bytes": resident_memory(),
+        "threads": threading.active_count(),
+        "sessions": len(_sessions),
+        "cached_responses": len(_responses),
+        "cached_response_bytes": _responses_size,
+        "pid": os.getpid(),
+        "startup": startup_report,
+    })
+
+# --- Live Coding WebSocket ---
+# Edits arriving closer together than this are batched into one update
+LIVE_DEBOUNCE_SECONDS = 0.25
+
+def live_session(ws):
+    """Streams graph deltas and refreshed traces while a client edits a file.
+
+    The client sends {"type": "open", "code": ...} once and then
+    {"type": "edit", "start": ..., "end": ..., "text": ...} character-offset edits.
+    After a quiet period the server replies with a "delta" message (line shifts,
+    then added, removed and changed nodes, edge changes and moved positions)
+    followed by a "trace". Invalid edits are answered with an "error" and dropped.
+    """
+    from code_graph import serialize_graph
+    from incremental import IncrementalAnalyzer, graph_delta, apply_edit
+    from tracer import run_trace
+
+    analyzer = IncrementalAnalyzer()
+    previous = ({}, set())
+    # Line shifts of the edits made since the last delta went out
+    shifts = []
+    code = ''
+    version = 0
+    dirty = False
+
+    while True:
+        message = ws.receive(timeout=LIVE_DEBOUNCE_SECONDS if dirty else None)
+        if message is not None:
+            try:
+                event = json.loads(message)
+            except ValueError:
+                ws.send(json.dumps({"type": "error", "error": "Messages must be JSON."}))
+                continue
+            if not isinstance(event, dict):
+                ws.send(json.dumps({"type": "error", "error": "Messages must be JSON objects."}))
+                continue
+            if event.get('type') == 'open':
+                if not isinstance(event.get('code', ''), str):
+                    ws.send(json.dumps({"type": "error", "error": "'code' must be a string."}))
+                    continue
+                code = event.get('code', '')
+                # A new buffer has no line correspondence with the old one
+                shifts.clear()
+            elif event.get('type') == 'edit':
+                try:
+                    code, shift = apply_edit(code, event)
+                except ValueError as e:
+                    # Drop the edit; the client can resync with an "open"
+                    ws.send(json.dumps({"type": "error", "error": str(e)}))
+                    continue
+                if shift:
+                    shifts.append(shift)
+            elif event.get('type') == 'close':
+                break
+            dirty = True
+            continue
+
+        # The client has gone quiet; push one update for everything since the last one
+        dirty = False
+        version += 1
+        try:
+            graph = analyzer.update(code)
+            pos = analyzer.layout(graph)
+        except SyntaxError as e:
+            # Keep the last good graph on screen while the user is mid-edit
+            ws.send(json.dumps({"type": "error", "version": version, "error": str(e)}))
+            continue
+        nodes, edges = serialize_graph(graph, pos)
+        delta, previous = graph_delta(previous, nodes, edges, shifts)
+        shifts.clear()
+        ws.send(json.dumps(dict(delta, type="delta", version=version, incremental=analyzer.stats)))
+        ws.send(json.dumps({"type": "trace", "version": version, "trace": run_trace(code)}))
+
+if Sock is not None:
+    Sock(app).route('/api/live')(live_session)
+
+if __name__ == '__main__':
+    # Add instructions to install dependencies. find_spec locates numpy without
+    # importing it; preload() below does that and reports what it cost.
+    if any(importlib.util.find_spec(name) is None for name in ('flask', 'flask_cors', 'numpy')):
         print("\n---")
         print("One or more required Python packages are not installed.")
         print("Please run the following command to install them:")
-        print("pip install Flask networkx Flask-Cors numpy")
+        print("pip install Flask Flask-Cors numpy")
         print("---\n")
         sys.exit(1)
 
+    if Sock is None:
+        print("Live editing over /api/live is disabled. Run 'pip install flask-sock' to enable it.")
     print("Starting Python Holodeck server at http://127.0.0.1:5001")
+    print("This is the single-process development server; see wsgi.py for production serving.")
+    preload()
     app.run(host='0.0.0.0', port=5001, debug=False)
@@ -1,23 +1,54 @@
-import { GraphData, ExecutionTrace } from '../types';
+import {
+  ExecutionTrace, GraphDelta, GraphResponse, CoverageInput, CoverageResponse, TraceSlice, GraphQuery, GraphQueryResponse,
+  ReplayLog, ReplayWindow,
+} from '../types';
 
 const LOCAL_SERVER_URL = 'http://127.0.0.1:5001/api/generate_graph';
+const LIVE_SESSION_URL = 'ws://127.0.0.1:5001/api/live';
+const COVERAGE_URL = 'http://127.0.0.1:5001/api/coverage';
+const TRACE_SLICE_URL = 'http://127.0.0.1:5001/api/trace_slice';
+const GRAPH_QUERY_URL = 'http://127.0.0.1:5001/api/graph_query';
+const RECORD_URL = 'http://127.0.0.1:5001/api/record';
+const REPLAY_URL = 'http://127.0.0.1:5001/api/replay';
 
-export const generateGraphFromCode = async (code: string): Promise<{ graph: GraphData; trace: ExecutionTrace; }> => {
+// Traces longer than this many steps come back as a playback summary
+export const PLAYBACK_FRAMES = 5000;
+
+// Recent responses by request body, so asking again sends If-None-Match and reuses them on 304 Not Modified
+const MAX_REMEMBERED_RESPONSES = 4;
+const rememberedResponses = new Map<string, { etag: string; data: any }>();
+
+export const generateGraphFromCode = async (code: string): Promise<GraphResponse> => {
   try {
+    const body = JSON.stringify({ code, frames: PLAYBACK_FRAMES });
+    const remembered = rememberedResponses.get(body);
     const response = await fetch(LOCAL_SERVER_URL, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
+        ...(remembered ? { 'If-None-Match': remembered.etag } : {}),
       },
-      body: JSON.stringify({ code }),
+      body,
     });
 
-    if (!response.ok) {
-      const errorData = await response.json().catch(() => ({ error: 'Server returned an invalid error response.' }));
-      throw new Error(errorData.error || `Server error: ${response.status} ${response.statusText}`);
+    let data;
+    if (response.status === 304 && remembered) {
+      data = remembered.data;
+    } else {
+      if (!response.ok) {
+        const errorData = await response.json().catch(() => ({ error: 'Server returned an invalid error response.' }));
+        throw new Error(errorData.error || `Server error: ${response.status} ${response.statusText}`);
+      }
+      data = await response.json();
+    }
+    const etag = response.headers.get('ETag');
+    rememberedResponses.delete(body);
+    if (etag) {
+      rememberedResponses.set(body, { etag, data });
+      if (rememberedResponses.size > MAX_REMEMBERED_RESPONSES) {
+        rememberedResponses.delete(rememberedResponses.keys().next().value!);
+      }
     }
-
-    const data = await response.json();
 
     if (!data.graph || !data.trace) {
       throw new Error('Invalid data structure received from the local server.');
@@ -26,6 +57,16 @@ export const generateGraphFromCode = async (code: string): Promise<{ graph: Grap
     return {
       graph: data.graph,
       trace: data.trace,
+      // Only present when the script ran code on more than one thread
+      threads: data.threads,
+      traceThreads: data.trace_threads,
+      // Only present for traces run with `async_tasks`
+      tasks: data.tasks,
+      traceTasks: data.trace_tasks,
+      memory: data.memory,
+      opcodes: data.opcodes,
+      // Only present when the trace was longer than PLAYBACK_FRAMES
+      playback: data.playback,
     };
 
   } catch (error) {
@@ -39,4 +80,91 @@ export const generateGraphFromCode = async (code: string): Promise<{ graph: Grap
     }
     throw new Error('An unknown error occurred while communicating with the local server.');
   }
-};
\ No newline at end of file
+};
+
+// POSTs a JSON body to the server and parses the reply; error responses become thrown Errors.
+const postJson = async (url: string, payload: object) => {
+  const response = await fetch(url, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify(payload),
+  }).catch(() => {
+    throw new Error('Could not connect to the local Python server. Is it running?');
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({ error: 'Server returned an invalid error response.' }));
+    throw new Error(errorData.error || `Server error: ${response.status} ${response.statusText}`);
+  }
+  return response.json();
+};
+
+// Runs the script once per input on the server and returns coverage merged over all runs.
+export const fetchCoverage = async (code: string, inputs: CoverageInput[]): Promise<CoverageResponse> =>
+  postJson(COVERAGE_URL, { code, inputs });
+
+// Fetches raw trace steps [start, end) behind a playback summary, e.g. one frame's range.
+export const fetchTraceSlice = async (code: string, start: number, end: number): Promise<TraceSlice> =>
+  postJson(TRACE_SLICE_URL, { code, frames: PLAYBACK_FRAMES, start, end });
+
+// Fetches only the part of the graph inside a viewport, e.g. the camera's frustum as it moves:
+// query.frustum = frustum.planes.map(p => [p.normal.x, p.normal.y, p.normal.z, p.constant])
+export const queryGraph = async (code: string, query: GraphQuery): Promise<GraphQueryResponse> =>
+  postJson(GRAPH_QUERY_URL, { code, frames: PLAYBACK_FRAMES, ...query });
+
+// Runs the script once and keeps only its replay log, from which any trace window can be regenerated.
+export const recordTrace = async (code: string, stdin = ''): Promise<{ log: ReplayLog; length: number }> =>
+  postJson(RECORD_URL, { code, stdin });
+
+export const replayTrace = async (code: string, log: ReplayLog, start: number, end: number): Promise<ReplayWindow> =>
+  postJson(REPLAY_URL, { code, log, start, end });
+
+export interface LiveSessionHandlers {
+  onDelta: (delta: GraphDelta) => void;
+  onTrace: (trace: ExecutionTrace, version: number) => void;
+  onError: (message: string) => void;
+}
+
+export interface LiveSession {
+  sendEdit: (start: number, end: number, text: string) => void;
+  close: () => void;
+}
+
+// Opens a live-coding session: the server debounces edits and pushes back only graph deltas and traces.
+export const openLiveSession = (code: string, handlers: LiveSessionHandlers): LiveSession => {
+  const socket = new WebSocket(LIVE_SESSION_URL);
+  const pending: string[] = [JSON.stringify({ type: 'open', code })];
+
+  const send = (message: string) => {
+    if (socket.readyState === WebSocket.OPEN) {
+      socket.send(message);
+    } else {
+      pending.push(message);
+    }
+  };
+
+  socket.onopen = () => {
+    pending.splice(0).forEach(message => socket.send(message));
+  };
+  socket.onmessage = (event) => {
+    const data = JSON.parse(event.data);
+    if (data.type === 'delta') {
+      handlers.onDelta(data as GraphDelta);
+    } else if (data.type === 'trace') {
+      handlers.onTrace(data.trace, data.version);
+    } else if (data.type === 'error') {
+      handlers.onError(data.error);
+    }
+  };
+  socket.onerror = () => handlers.onError('Could not connect to the local Python server. Is it running?');
+
+  return {
+    sendEdit: (start, end, text) => send(JSON.stringify({ type: 'edit', start, end, text })),
+    close: () => {
+      send(JSON.stringify({ type: 'close' }));
+      socket.close();
+    },
+  };
+};
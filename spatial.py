@@ -0,0 +1,183 @@
+import numpy as np
+
+# Points per k-d tree leaf; leaves are also the clusters far nodes are merged into
+LEAF_SIZE = 32
+OUTSIDE, PARTIAL, INSIDE = range(3)
+
+# --- K-d Tree ---
+class KDTree:
+    """Static k-d tree over 3D points, stored as flat arrays.
+
+    Node i covers points `order[start[i]:end[i]]` inside the box `low[i]`..`high[i]`;
+    inner nodes split at the median of their widest axis into `left[i]` and `right[i]`.
+    """
+
+    def __init__(self, points, leaf_size=LEAF_SIZE):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        n = len(self.points)
+        order = np.arange(n)
+        ranges, children, lows, highs = [], [], [], []
+
+        def add(start, end):
+            segment = self.points[order[start:end]]
+            ranges.append((start, end))
+            children.append([-1, -1])
+            lows.append(segment.min(axis=0) if end > start else np.zeros(3))
+            highs.append(segment.max(axis=0) if end > start else np.zeros(3))
+            return len(ranges) - 1
+
+        stack = [add(0, n)]
+        while stack:
+            node = stack.pop()
+            start, end = ranges[node]
+            extent = highs[node] - lows[node]
+            axis = int(np.argmax(extent))
+            # Small enough, or all points in one spot
+            if end - start <= leaf_size or extent[axis] == 0:
+                continue
+            mid = (start + end) // 2
+            segment = order[start:end]
+            order[start:end] = segment[np.argpartition(self.points[segment, axis], mid - start)]
+            children[node] = [add(start, mid), add(mid, end)]
+            stack.extend(children[node])
+
+        self.order = order
+        self.start, self.end = np.array(ranges, dtype=np.int64).reshape(-1, 2).T
+        self.left, self.right = np.array(children, dtype=np.int64).reshape(-1, 2).T
+        self.low = np.array(lows).reshape(-1, 3)
+        self.high = np.array(highs).reshape(-1, 3)
+        # Leaf holding each point
+        self.leaf_of = np.empty(n, dtype=np.int64)
+        for leaf in np.flatnonzero(self.left < 0).tolist():
+            self.leaf_of[order[self.start[leaf]:self.end[leaf]]] = leaf
+
+    def _classify(self, node, planes):
+        # Per plane, the box corner furthest along its normal and the one furthest against it
+        outer = np.where(planes[:, :3] >= 0, self.high[node], self.low[node])
+        inner = np.where(planes[:, :3] >= 0, self.low[node], self.high[node])
+        if np.any(np.einsum('ij,ij->i', planes[:, :3], outer) + planes[:, 3] < 0):
+            return OUTSIDE
+        if np.all(np.einsum('ij,ij->i', planes[:, :3], inner) + planes[:, 3] >= 0):
+            return INSIDE
+        return PARTIAL
+
+    def query_planes(self, planes):
+        """Sorted indices of the points p with a·p + d >= 0 for every plane row (a, d).
+
+        Subtrees entirely inside are taken whole and those entirely outside skipped,
+        so only leaves crossing a plane test their points one by one.
+        """
+        planes = np.asarray(planes, dtype=np.float64).reshape(-1, 4)
+        if not len(self.points):
+            return np.empty(0, dtype=np.int64)
+        found = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            side = self._classify(node, planes)
+            if side == OUTSIDE:
+                continue
+            members = self.order[self.start[node]:self.end[node]]
+            if side == INSIDE:
+                found.append(members)
+            elif self.left[node] >= 0:
+                stack.extend((self.left[node], self.right[node]))
+            else:
+                inside = np.all(self.points[members] @ planes[:, :3].T + planes[:, 3] >= 0, axis=1)
+                found.append(members[inside])
+        return np.sort(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+
+    def clusters(self, indices):
+        """Merges the given points by leaf into {position, count, radius} summaries."""
+        if not len(indices):
+            return []
+        leaves, inverse = np.unique(self.leaf_of[indices], return_inverse=True)
+        counts = np.bincount(inverse)
+        points = self.points[indices]
+        centers = np.stack([np.bincount(inverse, weights=points[:, axis]) for axis in range(3)], axis=1)
+        centers /= counts[:, None]
+        radius = np.zeros(len(leaves))
+        np.maximum.at(radius, inverse, np.linalg.norm(points - centers[inverse], axis=1))
+        return [{"position": center, "count": count, "radius": r}
+                for center, count, r in zip(centers.tolist(), counts.tolist(), radius.tolist())]
+
+
+def box_planes(low, high):
+    """The six planes bounding an axis-aligned box, facing inwards."""
+    planes = []
+    for axis in range(3):
+        normal = np.zeros(3)
+        normal[axis] = 1
+        planes.append([*normal, -low[axis]])
+        planes.append([*-normal, high[axis]])
+    return np.array(planes)
+
+
+# --- Viewport Queries ---
+class GraphIndex:
+    """A serialized graph (the response's nodes and edges) indexed by node position."""
+
+    def __init__(self, nodes, edges):
+        self.nodes = nodes
+        self.edges = edges
+        index_of = {node["id"]: index for index, node in enumerate(nodes)}
+        self.sources = np.array([index_of[edge["source"]] for edge in edges], dtype=np.int64)
+        self.targets = np.array([index_of[edge["target"]] for edge in edges], dtype=np.int64)
+        self.tree = KDTree([node["position"] for node in nodes])
+
+    def query(self, planes, camera=None, lod_distance=None):
+        """Nodes inside all the planes, and the edges touching them.
+
+        Visible nodes further than `lod_distance` from the camera come back merged
+        into clusters instead. Edges leaving the returned nodes list the positions
+        of their far ends as anchors, so they can be drawn without those nodes.
+        """
+        visible = self.tree.query_planes(planes)
+        near, far = visible, visible[:0]
+        if camera is not None and lod_distance is not None:
+            distances = np.linalg.norm(self.tree.points[visible] - np.asarray(camera, dtype=np.float64), axis=1)
+            near, far = visible[distances <= lod_distance], visible[distances > lod_distance]
+
+        shown = np.zeros(len(self.nodes), dtype=bool)
+        shown[near] = True
+        edges = np.flatnonzero(shown[self.sources] | shown[self.targets])
+        ends = np.union1d(self.sources[edges], self.targets[edges])
+        anchors = ends[~shown[ends]]
+        return {
+            "nodes": [self.nodes[index] for index in near.tolist()],
+            "edges": [self.edges[index] for index in edges.tolist()],
+            "anchors": [{"id": self.nodes[index]["id"], "position": self.nodes[index]["position"]}
+                        for index in anchors.tolist()],
+            "clusters": self.tree.clusters(far),
+            "total_nodes": len(self.nodes),
+            "visible_nodes": len(visible),
+        }
+
+
+def query_bounds(data):
+    """Reads a graph query's 'box' and/or 'frustum' into one array of planes.
+
+    'box' is {"min": [x, y, z], "max": [x, y, z]}; 'frustum' is a list of
+    [a, b, c, d] planes, a point p being inside when a·p + d >= 0 (three.js
+    Frustum planes as [normal.x, normal.y, normal.z, constant]).
+    """
+    planes = []
+    try:
+        if data.get('box') is not None:
+            low = np.asarray(data['box']['min'], dtype=np.float64).reshape(3)
+            high = np.asarray(data['box']['max'], dtype=np.float64).reshape(3)
+            planes.append(box_planes(low, high))
+        if data.get('frustum') is not None:
+            planes.append(np.asarray(data['frustum'], dtype=np.float64).reshape(-1, 4))
+        camera = data.get('camera')
+        camera = None if camera is None else np.asarray(camera, dtype=np.float64).reshape(3)
+        lod_distance = data.get('lod_distance')
+        lod_distance = None if lod_distance is None else float(lod_distance)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("'box' must be {\"min\": [x, y, z], \"max\": [x, y, z]}, 'frustum' a list of "
+                         "[a, b, c, d] planes, 'camera' [x, y, z] and 'lod_distance' a number.")
+    if not planes:
+        raise ValueError("Send a 'box' or a 'frustum' to query.")
+    if not np.all(np.isfinite(np.concatenate(planes))):
+        raise ValueError("Planes must be finite.")
+    return np.concatenate(planes), camera, lod_distance
@@ -0,0 +1,90 @@
+import ast
+from cfg import CFGBuilder, EDGE_CODES, build_cfg_graph
+
+
+def build(code):
+    builder = CFGBuilder()
+    builder.body(ast.parse(code).body, [])
+    return builder
+
+
+def block_of(builder, line):
+    return next(block for block, ranges in enumerate(builder.ranges)
+                if any(first <= line <= last for first, last in ranges))
+
+
+def edges_of(builder, kind):
+    return {(source, target) for source, target, code in builder.edges if code == EDGE_CODES[kind]}
+
+
+def test_try_else_gets_its_own_block():
+    builder = build(
+        "try:\n"           # 1
+        "    a = 1\n"      # 2
+        "except ValueError:\n"
+        "    a = 2\n"      # 4
+        "else:\n"
+        "    a = 3\n"      # 6
+        "b = a\n"          # 7
+    )
+    body, handler, orelse, after = (block_of(builder, line) for line in (2, 4, 6, 7))
+    assert len({body, handler, orelse, after}) == 4
+    assert (body, orelse) in edges_of(builder, 'flow')
+    # Only the try body raises into the handler
+    assert {source for source, target in edges_of(builder, 'exception') if target == handler} == {body}
+    assert (orelse, after) in edges_of(builder, 'flow')
+    assert (handler, after) in edges_of(builder, 'flow')
+
+
+def test_jumps_out_of_try_run_the_finally_block():
+    builder = build(
+        "for i in range(3):\n"    # 1
+        "    try:\n"
+        "        if i:\n"         # 3
+        "            break\n"     # 4
+        "        continue\n"      # 5
+        "    finally:\n"
+        "        done = i\n"      # 7
+        "print(done)\n"           # 8
+    )
+    header, brk, cont, final, after = (block_of(builder, line) for line in (1, 4, 5, 7, 8))
+    jumps = edges_of(builder, 'jump')
+    assert {(brk, final), (cont, final)} <= jumps
+    assert (brk, after) not in jumps and (cont, header) not in jumps
+    # After the finally block: on to the loop exit and back to the header
+    assert {(final, after), (final, header)} <= jumps
+
+
+def test_return_inside_try_goes_through_finally():
+    builder = build(
+        "def f():\n"           # 1
+        "    try:\n"
+        "        return 1\n"   # 3
+        "    finally:\n"
+        "        x = 2\n"      # 5
+        "    y = 3\n"          # 6
+    )
+    ret, final, dead = (block_of(builder, line) for line in (3, 5, 6))
+    assert (ret, final) in edges_of(builder, 'jump')
+    # The only path through the try returns, so nothing after it is reachable
+    assert not any(target == dead for _, target, _ in builder.edges)
+
+
+def test_cfg_graph_builds_for_try_else():
+    graph = build_cfg_graph("try:\n    a = 1\nexcept Exception:\n    a = 2\nelse:\n    a = 3\nprint(a)\n")
+    assert graph.num_nodes >= 4
+
+
+def test_nested_try_bodies_raise_into_the_outer_handlers():
+    builder = build(
+        "try:\n"                     # 1
+        "    try:\n"                 # 2
+        "        a = 1\n"            # 3
+        "    except KeyError:\n"
+        "        a = 2\n"            # 5
+        "except ValueError:\n"
+        "    a = 3\n"                # 7
+    )
+    body, inner, outer = (block_of(builder, line) for line in (3, 5, 7))
+    exceptions = edges_of(builder, 'exception')
+    assert {(body, inner), (body, outer), (inner, outer)} <= exceptions
@@ -0,0 +1,74 @@
+from code_graph import serialize_graph
+from incremental import IncrementalAnalyzer, apply_edit, graph_delta
+import pytest
+
+CODE = "import os\n" + "".join(f"def f{i}(x):\n    y = x + {i}\n    return y\n\n" for i in range(50)) + "print(f1(2))\n"
+
+
+def apply_delta(previous, delta):
+    """What the frontend does with a delta: shift, then remove, change, move and add."""
+    nodes, edges = previous
+    for shift in delta["shifts"]:
+        line, offset = shift["from"], shift["by"]
+        low = line + min(offset, 0)
+        nodes = {i + offset if i >= line else i: node for i, node in nodes.items() if not low <= i < line}
+        edges = {(s + offset if s >= line else s, t + offset if t >= line else t)
+                 for s, t in edges if not (low <= s < line or low <= t < line)}
+    nodes = {i: node for i, node in nodes.items() if i not in delta["nodes"]["removed"]}
+    for update in delta["nodes"]["changed"]:
+        nodes[update["id"]] = dict(nodes[update["id"]], **update)
+    for node_id, position in delta["positions"].items():
+        nodes[node_id] = dict(nodes[node_id], position=position)
+    nodes.update((node["id"], node) for node in delta["nodes"]["added"])
+    edges -= {(edge["source"], edge["target"]) for edge in delta["edges"]["removed"]}
+    edges |= {(edge["source"], edge["target"]) for edge in delta["edges"]["added"]}
+    return nodes, edges
+
+
+def snapshot(analyzer, code):
+    graph = analyzer.update(code)
+    return serialize_graph(graph, analyzer.layout(graph))
+
+
+@pytest.mark.parametrize("edits", [
+    [(CODE.index("def f1("), 0, "z = 5\n")],
+    [(CODE.index("def f1("), len("def f1(x):\n"), "")],
+    [(CODE.index("def f3("), 0, "a = 1\nb = 2\n"), (CODE.index("def f1("), 0, "c = 3\n")],
+    [(CODE.index("def f2("), len("def f2(x):\n    y = x + 2\n    return y\n\n"), "w = 1\n")],
+])
+def test_shifted_deltas_rebuild_the_new_graph(edits):
+    analyzer = IncrementalAnalyzer()
+    _, previous = graph_delta(({}, set()), *snapshot(analyzer, CODE))
+    code, shifts = CODE, []
+    for start, length, text in edits:
+        code, shift = apply_edit(code, {"start": start, "end": start + length, "text": text})
+        shifts.append(shift)
+    nodes, edges = snapshot(analyzer, code)
+    delta, current = graph_delta(previous, nodes, edges, shifts)
+
+    client_nodes, client_edges = apply_delta(previous, delta)
+    assert client_edges == current[1]
+    assert {i: (n["code"], n["type"]) for i, n in client_nodes.items()} == \
+        {i: (n["code"], n["type"]) for i, n in current[0].items()}
+    # Only the edited region goes out
+    assert len(delta["nodes"]["added"]) + len(delta["nodes"]["changed"]) <= 6
+
+
+@pytest.mark.parametrize("edit", [
+    {"start": "1", "end": 1}, {"start": 5, "end": 2}, {"start": 0, "end": len(CODE) + 1},
+    {"start": True, "end": 1}, {"start": 0, "end": 0, "text": 3}, {},
+])
+def test_apply_edit_rejects_malformed_edits(edit):
+    with pytest.raises(ValueError):
+        apply_edit(CODE, edit)
+
+
+def test_repeated_statements_keep_their_own_positions():
+    analyzer = IncrementalAnalyzer()
+    code = "x = 1\nprint(x)\ny = 2\nprint(x)\nz = 3\n"
+    graph = analyzer.update(code)
+    before = dict(zip(graph.ids.tolist(), analyzer.layout(graph).tolist()))
+    graph = analyzer.update("w = 0\n" + code)
+    after = dict(zip(graph.ids.tolist(), analyzer.layout(graph).tolist()))
+    # Every old line moved down by one and kept its place
+    assert all(after[line + 1] == position for line, position in before.items())
@@ -0,0 +1,77 @@
+import time
+import numpy as np
+from code_graph import build_code_graph, layout_3d
+from layout import merge_edge_weights, spring_layout_3d
+from pipeline import build_graph_response
+
+
+def test_merge_edge_weights_keeps_largest_duplicate():
+    sources, targets, weights = merge_edge_weights(3, [0, 0, 1], [1, 1, 2], [1.0, 5.0, 2.0])
+    assert sources.tolist() == [0, 1]
+    assert targets.tolist() == [1, 2]
+    assert weights.tolist() == [5.0, 2.0]
+
+
+def test_merge_edge_weights_without_edges():
+    sources, targets, weights = merge_edge_weights(1, [], [], [])
+    assert sources.size == targets.size == weights.size == 0
+
+
+def test_weighted_layout_of_edgeless_graphs():
+    for code in ('x = 1\n', ''):
+        graph = build_code_graph(code)
+        empty = np.empty(0, dtype=np.int64)
+        assert layout_3d(graph, (empty, empty, empty)).shape == (graph.num_nodes, 3)
+    for mode in ('lines', 'cfg'):
+        response = build_graph_response('x = 1\n', mode=mode, weighted_layout=True)
+        assert len(response["graph"]["nodes"]) == 1
+
+
+def dense_spring_layout(num_nodes, sources, targets, pos, fixed, k=0.5, iterations=15):
+    """The all-pairs reference: forces on every node, then fixed nodes held still."""
+    positions = pos.copy()
+    pull_from, pull_to = np.concatenate((sources, targets)), np.concatenate((targets, sources))
+    temperature = max(np.ptp(positions[:, 0]), np.ptp(positions[:, 1])) * 0.1
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        delta = positions[:, np.newaxis] - positions[np.newaxis]
+        repulsion = k * k / np.clip(np.einsum('ijk,ijk->ij', delta, delta), 1e-4, None)
+        np.fill_diagonal(repulsion, 0.0)
+        displacement = np.einsum('ij,ijk->ik', repulsion, delta)
+        pull = positions[pull_from] - positions[pull_to]
+        force = pull * (np.clip(np.linalg.norm(pull, axis=1), 0.01, None) / k)[:, np.newaxis]
+        np.subtract.at(displacement, pull_from, force)
+        length = np.linalg.norm(displacement, axis=1)
+        step = displacement * (temperature / np.where(length < 0.01, 0.1, length))[:, np.newaxis]
+        step[fixed] = 0.0
+        positions += step
+        temperature -= cooling
+    return positions
+
+
+def chain_with_new_nodes(num_nodes, num_new, seed=0):
+    rng = np.random.RandomState(seed)
+    sources = np.arange(num_nodes - 1)
+    pos = rng.rand(num_nodes, 3)
+    fixed = np.ones(num_nodes, dtype=bool)
+    fixed[rng.choice(num_nodes, num_new, replace=False)] = False
+    return sources, sources + 1, pos, fixed
+
+
+def test_partial_relayout_matches_the_all_pairs_forces():
+    sources, targets, pos, fixed = chain_with_new_nodes(200, 7)
+    moved = spring_layout_3d(200, sources, targets, pos=pos, fixed=fixed, iterations=15, threshold=0)
+    np.testing.assert_array_equal(moved[fixed], pos[fixed])
+    np.testing.assert_allclose(moved, dense_spring_layout(200, sources, targets, pos, fixed), atol=1e-9)
+
+
+def test_partial_relayout_scales_with_the_moving_nodes():
+    # 10 new lines in a 4k-line file: forces for 10 rows instead of 4k
+    sources, targets, pos, fixed = chain_with_new_nodes(4000, 10)
+    timings = []
+    for mask in (None, fixed):
+        started = time.perf_counter()
+        spring_layout_3d(4000, sources, targets, pos=pos, fixed=mask, iterations=15, threshold=0)
+        timings.append(time.perf_counter() - started)
+    full, partial = timings
+    assert partial * 20 < full, f"partial relayout {partial:.3f}s vs full {full:.3f}s"
@@ -0,0 +1,14 @@
+import pytest
+from loadtest import percentile
+
+
+@pytest.mark.parametrize("count, fraction, expected", [
+    (100, 0.5, 50), (100, 0.95, 95), (100, 0.99, 99), (100, 0.07, 7), (100, 1.0, 100),
+    (20, 0.95, 19), (20, 0.5, 10), (1, 0.99, 1), (3, 0.0, 1),
+])
+def test_nearest_rank_percentile(count, fraction, expected):
+    assert percentile(list(range(1, count + 1)), fraction) == expected
+
+
+def test_percentile_of_nothing():
+    assert percentile([], 0.5) is None
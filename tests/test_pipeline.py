@@ -0,0 +1,15 @@
+import pytest
+from pipeline import coverage_inputs
+
+
+def test_coverage_inputs_fill_in_defaults():
+    assert coverage_inputs({"inputs": [{}, {"argv": [1], "seed": 3}]}) == [
+        {"argv": [], "stdin": "", "seed": None},
+        {"argv": ["1"], "stdin": "", "seed": 3},
+    ]
+
+
+@pytest.mark.parametrize("run_input", [{"seed": True}, {"seed": False}, {"seed": "1"}, {"argv": "a"}, {"stdin": 1}])
+def test_coverage_inputs_reject_bad_fields(run_input):
+    with pytest.raises(ValueError):
+        coverage_inputs({"inputs": [run_input]})
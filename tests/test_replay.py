@@ -0,0 +1,34 @@
+import time
+import replay
+from replay import record_trace, replay_trace
+
+# Polls the clock for a while after the recording's timeout
+POLLING = """
+import time
+end = time.perf_counter() + 0.5
+while time.perf_counter() < end:
+    pass
+"""
+
+
+def test_recording_caps_logged_readings(monkeypatch):
+    monkeypatch.setattr(replay, 'MAX_LOGGED_READINGS', 1000)
+    _, log = record_trace(POLLING, timeout=0.3)
+    assert log["truncated"]
+    assert sum(len(values) for values in log["time"].values()) == 1000
+
+
+def test_log_stops_growing_once_recorded():
+    _, log = record_trace(POLLING, timeout=0.1)
+    logged = len(log["time"]["perf_counter"])
+    time.sleep(0.2)
+    assert len(log["time"]["perf_counter"]) == logged
+    assert not log["truncated"]
+
+
+def test_replay_reproduces_the_recording():
+    code = "import random, time\nvalues = [random.random() for _ in range(3)]\nstamp = time.time()\n"
+    recorded, log = record_trace(code)
+    replayed, diverged = replay_trace(code, log)
+    assert not diverged
+    assert replayed.lines.tolist() == recorded.lines.tolist()
@@ -0,0 +1,30 @@
+from trace_analysis import line_count_deltas
+
+
+def test_line_count_deltas():
+    deltas = line_count_deltas([1, 2, 3, 3], [1, 3, 5])
+    assert deltas == {"lines": [2, 3, 5], "a": [1, 2, 0], "b": [0, 1, 1], "delta": [-1, -1, 1]}
+
+
+def test_line_count_deltas_do_not_scale_with_line_numbers():
+    # Sized by the distinct lines; a dense count would need 24 GB here
+    deltas = line_count_deltas([1, 2, 3], [1, 3_000_000_000])
+    assert deltas["lines"] == [2, 3, 3_000_000_000]
+
+
+def test_instructions_are_counted_per_code_object():
+    from pipeline import build_graph_response
+    response = build_graph_response("total = sum(i * 2 for i in range(1000))\n", opcodes=True)
+    hottest = response["opcodes"]["hot"][0]
+    # The generator's loop, not the module instruction at the same line and offset
+    assert (hottest["function"], hottest["op"], hottest["count"]) == ("<genexpr>", "FOR_ITER", 1001)
+
+
+def test_diff_finds_a_change_deep_inside_a_long_loop():
+    from trace_analysis import diff_traces
+    body = [3, 4, 5, 6]
+    trace_a = [1, 2] + body * 250_000
+    trace_b = list(trace_a)
+    trace_b[2 + 200_000 * len(body) + 1] = 9
+    divergences = diff_traces(trace_a, trace_b)["divergences"]
+    assert divergences == [{"a_step": 800_003, "b_step": 800_003, "kind": "replace"}]
@@ -0,0 +1,65 @@
+import sys
+import threading
+import time
+from array import array
+import tracer
+from tracer import run_trace_detailed, _rows
+
+THREADED = """
+import threading
+def work():
+    total = 0
+    for i in range(3):
+        total += i
+t = threading.Thread(target=work)
+t.start()
+t.join()
+"""
+
+
+def test_threads_started_by_the_script_are_traced():
+    result = run_trace_detailed(THREADED)
+    assert len(result.threads) == 2
+    assert 5 in result.lines.tolist()
+    assert threading.Thread.start is tracer._thread_start
+
+
+def test_threads_started_outside_the_script_are_not_hooked():
+    script = threading.Thread(target=run_trace_detailed, args=("import time\ntime.sleep(0.5)\n",))
+    script.start()
+    while not tracer._active_tracers:
+        time.sleep(0.01)
+    hooks = []
+    # A thread the server starts while a script is being traced
+    outside = threading.Thread(target=lambda: hooks.append(sys.gettrace()))
+    outside.start()
+    outside.join()
+    script.join()
+    assert hooks == [None]
+
+
+def test_buffers_can_grow_while_they_are_read():
+    # What a thread that outlived the timeout does while the result is merged
+    buffer, stop, errors = array('q'), threading.Event(), []
+
+    def append():
+        try:
+            while not stop.is_set():
+                buffer.extend((1, 2))
+                if len(buffer) > 10_000:
+                    del buffer[:]
+        except BufferError as e:
+            errors.append(e)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    writer = threading.Thread(target=append)
+    writer.start()
+    try:
+        for _ in range(2_000):
+            _rows(buffer, 2)
+    finally:
+        stop.set()
+        writer.join()
+        sys.setswitchinterval(interval)
+    assert errors == []
@@ -0,0 +1,586 @@
+import bisect
+import dis
+import heapq
+import types
+import numpy as np
+
+# Above this many possible (source, target) pairs a dense bincount would allocate
+# more memory than the trace itself is worth, so we count the unique pairs instead.
+DENSE_PAIR_LIMIT = 1 << 22
+
+# --- Runtime Transition Weights ---
+def transition_counts(steps, num_nodes, groups=None):
+    """Counts every (node -> next node) transition taken in a trace of node indices.
+
+    `groups` optionally gives the thread of each step; steps of different threads
+    interleave in a merged trace, so only pairs within one thread are counted.
+    """
+    steps = np.asarray(steps, dtype=np.int64)
+    # Lines outside the submitted source (e.g. library code) map to no node
+    inside = (steps >= 0) & (steps < num_nodes)
+    steps = steps[inside]
+    if steps.size < 2:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+
+    # Encode each consecutive pair as a single integer so it can be counted in one pass
+    codes = steps[:-1] * num_nodes + steps[1:]
+    if groups is not None:
+        groups = np.asarray(groups)[inside]
+        codes = codes[groups[:-1] == groups[1:]]
+    if num_nodes * num_nodes <= DENSE_PAIR_LIMIT:
+        counts = np.bincount(codes)
+        pairs = np.flatnonzero(counts)
+        counts = counts[pairs]
+    else:
+        pairs, counts = np.unique(codes, return_counts=True)
+    return pairs // num_nodes, pairs % num_nodes, counts
+
+
+def transition_edges(graph, trace, threads=None):
+    return transition_counts(graph.nodes_for_lines(trace), graph.num_nodes, threads)
+
+
+def weighted_edges(graph, transitions):
+    """Merges the static graph edges with the transitions observed at runtime."""
+    n = graph.num_nodes
+    static_sources, static_targets = graph.edge_arrays()
+    static_codes = static_sources.astype(np.int64) * n + static_targets
+    sources, targets, counts = transitions
+    codes = sources * n + targets
+
+    # Transition codes come out sorted, so each static edge can be looked up directly
+    slot = np.clip(np.searchsorted(codes, static_codes), 0, max(len(codes) - 1, 0))
+    hit = codes[slot] == static_codes if len(codes) else np.zeros(len(static_codes), dtype=bool)
+    static_weights = np.where(hit, counts[slot] if len(codes) else 0, 0)
+    # Calls, returns and loop exits only show up in the trace
+    runtime_only = ~np.isin(codes, static_codes)
+
+    ids = graph.ids
+    edges = [
+        {"source": s, "target": t, "weight": w, "runtime_only": False}
+        for s, t, w in zip(ids[static_sources].tolist(), ids[static_targets].tolist(), static_weights.tolist())
+    ]
+    edges.extend(
+        {"source": s, "target": t, "weight": w, "runtime_only": True}
+        for s, t, w in zip(ids[sources[runtime_only]].tolist(), ids[targets[runtime_only]].tolist(),
+                           counts[runtime_only].tolist())
+    )
+    return edges
+
+
+# --- Instruction Profiles ---
+def instruction_counts(events, top=32, field_bits=24):
+    """Aggregates packed code << 48 | line << 24 | offset instruction events from the opcode tracer.
+
+    Returns the executed lines with their instruction counts, and the `top` most
+    executed (code index, line, offset, count) instructions.
+    """
+    packed, counts = np.unique(np.asarray(events, dtype=np.int64), return_counts=True)
+    mask = (1 << field_bits) - 1
+    codes, lines, offsets = packed >> 2 * field_bits, (packed >> field_bits) & mask, packed & mask
+    per_line = np.bincount(lines, weights=counts).astype(np.int64) if len(lines) else np.empty(0, dtype=np.int64)
+    executed = np.flatnonzero(per_line)
+    hottest = np.argsort(-counts, kind='stable')[:top]
+    hot = list(zip(codes[hottest].tolist(), lines[hottest].tolist(), offsets[hottest].tolist(),
+                   counts[hottest].tolist()))
+    return executed, per_line[executed], hot
+
+
+def code_objects(code_string):
+    """Yields the module code object of a script and every function, class and lambda in it."""
+    pending = [compile(code_string, '<script>', 'exec')]
+    while pending:
+        code = pending.pop()
+        yield code
+        pending.extend(const for const in code.co_consts if isinstance(const, types.CodeType))
+
+
+def instruction_names(codes):
+    """Maps (code index, bytecode offset) to an instruction name for the given {index: code object}."""
+    return {(index, instruction.offset): instruction.opname
+            for index, code in codes.items() for instruction in dis.get_instructions(code)}
+
+
+def executable_lines(code_string):
+    """Lines that hold code the interpreter can execute, i.e. can appear in a trace."""
+    lines = set()
+    for code in code_objects(code_string):
+        lines.update(line for _, _, line in code.co_lines() if line is not None)
+    # Line 0 marks instructions with no source line of their own
+    lines.discard(0)
+    return sorted(lines)
+
+
+# --- Loop Folding ---
+class TokenTable:
+    """Interns trace tokens so identical lines and loops get the same id across traces."""
+
+    def __init__(self):
+        self.ids = {}
+        # id -> (children, repeat count, number of raw steps); a line has no children
+        self.entries = []
+
+    def _intern(self, key, children, count, length):
+        token_id = self.ids.get(key)
+        if token_id is None:
+            token_id = len(self.entries)
+            self.ids[key] = token_id
+            self.entries.append((children, count, length))
+        return token_id
+
+    def lines(self, trace):
+        steps = np.asarray(trace, dtype=np.int64)
+        unique, inverse = np.unique(steps, return_inverse=True)
+        line_ids = np.array([self._intern(('line', int(line)), (), int(line), 1) for line in unique], dtype=np.int64)
+        return line_ids[inverse]
+
+    def loop(self, children, count):
+        length = sum(self.entries[child][2] for child in children) * count
+        return self._intern(('loop', children, count), children, count, length)
+
+    def is_loop(self, token_id):
+        return bool(self.entries[token_id][0])
+
+    def length(self, token_id):
+        return self.entries[token_id][2]
+
+    def expand(self, token_id, limit):
+        """Returns up to `limit` raw line numbers that the token stands for."""
+        out = []
+        stack = [(token_id, 0)]
+        while stack and len(out) < limit:
+            current, done = stack.pop()
+            children, count, _ = self.entries[current]
+            if not children:
+                out.append(count)
+                continue
+            if done + 1 < count:
+                stack.append((current, done + 1))
+            stack.extend((child, 0) for child in reversed(children))
+        return out
+
+
+def _fold_pass(ids, table, max_period):
+    n = ids.size
+    best_len = np.zeros(n, dtype=np.int64)
+    best_period = np.zeros(n, dtype=np.int64)
+
+    # For each period p, find how far the sequence starting at i stays p-periodic
+    for period in range(1, min(max_period, n // 2) + 1):
+        matches = ids[period:] == ids[:-period]
+        m = matches.size
+        positions = np.arange(m)
+        next_mismatch = np.minimum.accumulate(np.where(matches, m, positions)[::-1])[::-1]
+        repeats = (next_mismatch - positions + period) // period
+        covered = np.where(repeats >= 2, repeats * period, 0)
+        window_len = best_len[:m]
+        better = covered > window_len
+        window_len[better] = covered[better]
+        best_period[:m][better] = period
+
+    candidates = np.flatnonzero(best_len).tolist()
+    folded = []
+    i = 0
+    while i < n:
+        c = bisect.bisect_left(candidates, i)
+        if c == len(candidates):
+            folded.extend(ids[i:].tolist())
+            break
+        start = int(candidates[c])
+        folded.extend(ids[i:start].tolist())
+        period = int(best_period[start])
+        length = int(best_len[start])
+        folded.append(table.loop(tuple(ids[start:start + period].tolist()), length // period))
+        i = start + length
+    return np.array(folded, dtype=np.int64)
+
+
+def fold_loops(trace, table=None, max_period=16, max_levels=4):
+    """Compresses a trace by folding repeated stretches into loop tokens.
+
+    Each pass folds tandem repeats of up to `max_period` tokens, so nested loops
+    collapse level by level. Returns the token ids and the shared table.
+    """
+    table = table or TokenTable()
+    ids = table.lines(trace)
+    for _ in range(max_levels):
+        folded = _fold_pass(ids, table, max_period)
+        if folded.size == ids.size:
+            break
+        ids = folded
+    return ids, table
+
+
+# --- Playback Summary ---
+PLAYBACK_KINDS = ('step', 'branch', 'loop_entry', 'loop', 'loop_exit')
+STEP, BRANCH, LOOP_ENTRY, LOOP, LOOP_EXIT = range(len(PLAYBACK_KINDS))
+# Frames of a more important kind are kept first when the budget is short
+PLAYBACK_IMPORTANCE = {LOOP_ENTRY: 3, LOOP_EXIT: 3, BRANCH: 2, LOOP: 1, STEP: 0}
+
+
+def _token_arrays(table):
+    """First and last raw step, repeat count, raw length and frame cost of every token."""
+    size = len(table.entries)
+    first, last = np.empty(size, dtype=np.int64), np.empty(size, dtype=np.int64)
+    counts, lengths = np.ones(size, dtype=np.int64), np.empty(size, dtype=np.int64)
+    is_loop = np.zeros(size, dtype=bool)
+    # Children are always interned before the loops made of them
+    for token_id, (children, count, length) in enumerate(table.entries):
+        lengths[token_id] = length
+        if children:
+            first[token_id], last[token_id] = first[children[0]], last[children[-1]]
+            counts[token_id], is_loop[token_id] = count, True
+        else:
+            first[token_id] = last[token_id] = count
+    # A line is one frame; a loop is entry and exit, plus one for the repeats between
+    costs = np.where(is_loop, np.where(counts > 2, 3, 2), 1)
+    return first, last, counts, lengths, is_loop, costs
+
+
+def _spread(indices, limit):
+    """Keeps `limit` of the given positions, evenly spaced and including both ends."""
+    if len(indices) <= limit:
+        return indices
+    return indices[np.unique(np.linspace(0, len(indices) - 1, limit).round().astype(np.int64))]
+
+
+def _unfold_to_budget(tokens, table, costs, frames):
+    """Unfolds the longest loops, one level at a time, while the frames still fit."""
+    total = int(costs[tokens].sum())
+    # Unfolding never lowers the frame count, so a full budget can't take any more
+    loops = np.flatnonzero(costs[tokens] > 1).tolist() if total < frames else []
+    # Each slot is a token, or the list of slots it was unfolded into
+    slots = tokens.tolist()
+    heap = [(-table.length(slots[index]), index, slots, index) for index in loops]
+    heapq.heapify(heap)
+    counter = len(heap)
+    unfolded_any = False
+    while heap and total < frames:
+        _, _, parent, index = heapq.heappop(heap)
+        token = parent[index]
+        children, count, _ = table.entries[token]
+        unfolded_cost = int(costs[list(children)].sum()) * count
+        # A shorter loop may still fit after a longer one did not
+        if total - int(costs[token]) + unfolded_cost > frames:
+            continue
+        total += unfolded_cost - int(costs[token])
+        parent[index] = unfolded = list(children) * count
+        unfolded_any = True
+        for child_index, child in enumerate(unfolded):
+            if costs[child] > 1:
+                heapq.heappush(heap, (-table.length(child), counter, unfolded, child_index))
+                counter += 1
+    if not unfolded_any:
+        return tokens
+
+    flat = []
+    stack = [iter(slots)]
+    while stack:
+        for slot in stack[-1]:
+            if isinstance(slot, list):
+                stack.append(iter(slot))
+                break
+            flat.append(slot)
+        else:
+            stack.pop()
+    return np.array(flat, dtype=np.int64)
+
+
+def playback_frames(trace, frames, max_period=16):
+    """Summarizes a trace as at most `frames` animation frames.
+
+    Repeated stretches are folded with fold_loops, and the longest loops are unfolded
+    again while the budget allows. A loop that stays folded becomes an entry
+    frame (its first iteration), one frame standing for the repeats in between and
+    an exit frame (its last iteration). A step that leaves a node for a different
+    successor than the last time is a branch change. When there are more candidate
+    frames than the budget, the more important kinds are kept first and steps of
+    equal importance are thinned evenly. Each kept frame then runs until the next
+    one starts, so `starts`/`ends` partition the raw trace for drilling in.
+    """
+    steps = np.asarray(trace, dtype=np.int64)
+    if steps.size == 0 or frames < 1:
+        return {"nodes": [], "starts": [], "ends": [], "kinds": [], "repeats": [], "kind_names": PLAYBACK_KINDS}
+
+    tokens, table = fold_loops(steps, max_period=max_period)
+    first, last, counts, lengths, is_loop, costs = _token_arrays(table)
+    tokens = _unfold_to_budget(tokens, table, costs, frames)
+    token_lengths = lengths[tokens]
+    offsets = np.concatenate(([0], np.cumsum(token_lengths)[:-1]))
+
+    # Branch changes: compare each boundary transition with the previous one out of the same node
+    token_kinds = np.full(len(tokens), STEP, dtype=np.int64)
+    if len(tokens) > 1:
+        sources, targets = last[tokens[:-1]], first[tokens[1:]]
+        order = np.argsort(sources, kind='stable')
+        changed = np.zeros(len(order), dtype=bool)
+        changed[1:] = (sources[order][1:] == sources[order][:-1]) & (targets[order][1:] != targets[order][:-1])
+        branch = np.zeros(len(order), dtype=bool)
+        branch[order] = changed
+        token_kinds[1:][branch] = BRANCH
+
+    # Candidate frames in trace order, `costs` of them per token
+    token_costs = costs[tokens]
+    owner = np.repeat(np.arange(len(tokens)), token_costs)
+    within = np.arange(len(owner)) - np.repeat(np.cumsum(token_costs) - token_costs, token_costs)
+    loop = is_loop[tokens][owner]
+    period = (token_lengths // counts[tokens])[owner]
+    exit_frame = loop & (within == token_costs[owner] - 1)
+    middle = loop & (within == 1) & ~exit_frame
+    nodes = first[tokens][owner]
+    starts = offsets[owner] + np.where(middle, period, 0) + np.where(exit_frame, token_lengths[owner] - period, 0)
+    kinds = np.where(loop, np.where(exit_frame, LOOP_EXIT, np.where(middle, LOOP, LOOP_ENTRY)), token_kinds[owner])
+    repeats = np.where(middle, counts[tokens][owner] - 2, 1)
+
+    # Fill the budget one importance level at a time; the first frame is always kept
+    keep = np.zeros(len(nodes), dtype=bool)
+    keep[0] = True
+    importance = np.array([PLAYBACK_IMPORTANCE[kind] for kind in range(len(PLAYBACK_KINDS))])[kinds]
+    for level in sorted(set(PLAYBACK_IMPORTANCE.values()), reverse=True):
+        room = frames - int(keep.sum())
+        if room <= 0:
+            break
+        keep[_spread(np.flatnonzero((importance == level) & ~keep), room)] = True
+
+    kept = np.flatnonzero(keep)
+    ends = np.append(starts[kept][1:], steps.size)
+    return {
+        "nodes": nodes[kept].tolist(),
+        "starts": starts[kept].tolist(),
+        "ends": ends.tolist(),
+        "kinds": kinds[kept].tolist(),
+        "repeats": repeats[kept].tolist(),
+        "kind_names": PLAYBACK_KINDS,
+    }
+
+
+# --- Trace Alignment ---
+def _myers_opcodes(a, b, max_edits):
+    """Myers' O((N+M)D) diff. Returns difflib-style opcodes or None past `max_edits`."""
+    n, m = len(a), len(b)
+    v = {1: 0}
+    history = []
+    for d in range(max_edits + 1):
+        history.append(dict(v))
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= n and y >= m:
+                return _backtrack(history, n, m)
+    return None
+
+
+def _backtrack(history, n, m):
+    x, y = n, m
+    moves = []
+    for d in range(len(history) - 1, -1, -1):
+        v = history[d]
+        k = x - y
+        if d == 0:
+            prev_x = prev_y = 0
+        else:
+            prev_k = k + 1 if k == -d or (k != d and v[k - 1] < v[k + 1]) else k - 1
+            prev_x = v[prev_k]
+            prev_y = prev_x - prev_k
+        # Diagonal run of matches first, then the single edit that led into it
+        while x > prev_x and y > prev_y:
+            moves.append(('equal', x - 1, y - 1))
+            x -= 1
+            y -= 1
+        if d > 0:
+            moves.append(('delete', prev_x, prev_y) if x > prev_x else ('insert', prev_x, prev_y))
+        x, y = prev_x, prev_y
+    moves.reverse()
+
+    # Group single moves into difflib-style (tag, i1, i2, j1, j2) opcodes
+    opcodes = []
+    x = y = 0
+    for tag, _, _ in moves:
+        nx_, ny_ = x + (tag != 'insert'), y + (tag != 'delete')
+        kind = 'equal' if tag == 'equal' else 'replace'
+        if opcodes and opcodes[-1][0] == kind:
+            opcodes[-1][2], opcodes[-1][4] = nx_, ny_
+        else:
+            opcodes.append([kind, x, nx_, y, ny_])
+        x, y = nx_, ny_
+    return [tuple(op) for op in opcodes]
+
+
+def align_tokens(a, b, max_edits=2000):
+    """Aligns two token sequences, trimming the shared prefix and suffix first."""
+    n, m = a.size, b.size
+    shortest = min(n, m)
+    mismatch = np.flatnonzero(a[:shortest] != b[:shortest])
+    prefix = int(mismatch[0]) if mismatch.size else shortest
+    mismatch = np.flatnonzero(a[::-1][:shortest - prefix] != b[::-1][:shortest - prefix])
+    suffix = int(mismatch[0]) if mismatch.size else shortest - prefix
+
+    mid_a = a[prefix:n - suffix].tolist()
+    mid_b = b[prefix:m - suffix].tolist()
+    opcodes = _myers_opcodes(mid_a, mid_b, max_edits)
+    truncated = opcodes is None
+    if truncated:
+        # Too different to align cheaply; report the whole middle as one segment
+        opcodes = [('replace', 0, len(mid_a), 0, len(mid_b))] if mid_a or mid_b else []
+
+    aligned = [('equal', 0, prefix, 0, prefix)] if prefix else []
+    aligned.extend((tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix) for tag, i1, i2, j1, j2 in opcodes)
+    if suffix:
+        aligned.append(('equal', n - suffix, n, m - suffix, m))
+    return aligned, truncated
+
+
+def line_count_deltas(trace_a, trace_b):
+    a = np.asarray(trace_a, dtype=np.int64)
+    b = np.asarray(trace_b, dtype=np.int64)
+    a, b = a[a >= 0], b[b >= 0]
+    # Counted over the distinct lines, so memory follows the traces and not their largest line number
+    lines, inverse = np.unique(np.concatenate((a, b)), return_inverse=True)
+    counts_a = np.bincount(inverse[:len(a)], minlength=len(lines))
+    counts_b = np.bincount(inverse[len(a):], minlength=len(lines))
+    changed = np.flatnonzero(counts_a != counts_b)
+    return {
+        "lines": lines[changed].tolist(),
+        "a": counts_a[changed].tolist(),
+        "b": counts_b[changed].tolist(),
+        "delta": (counts_b[changed] - counts_a[changed]).tolist(),
+    }
+
+
+def diff_traces(trace_a, trace_b, max_period=16, max_edits=2000, preview=50, max_unfold=200000):
+    """Compares two execution traces after loop folding.
+
+    Returns the divergence points (as raw step indices), per-line count deltas and
+    the differing segments with a short preview of the lines each side executed.
+    """
+    table = TokenTable()
+    tokens_a, _ = fold_loops(trace_a, table, max_period)
+    tokens_b, _ = fold_loops(trace_b, table, max_period)
+
+    segments = []
+    lengths = _token_lengths(table, np.empty(0, dtype=np.int64))
+    truncated = _diff_tokens(table, lengths, tokens_a, tokens_b, 0, 0, segments,
+                             max_edits=max_edits, preview=preview, max_unfold=max_unfold, depth=4)
+    return {
+        "divergences": [{"a_step": s["a"][0], "b_step": s["b"][0], "kind": s["kind"]} for s in segments],
+        "line_deltas": line_count_deltas(trace_a, trace_b),
+        "segments": segments,
+        "compressed_length": [int(tokens_a.size), int(tokens_b.size)],
+        "truncated": truncated,
+    }
+
+
+def _token_lengths(table, lengths):
+    """Raw step counts of every token, extending `lengths` by the tokens interned since."""
+    if len(lengths) == len(table.entries):
+        return lengths
+    added = [entry[2] for entry in table.entries[len(lengths):]]
+    return np.concatenate((lengths, np.array(added, dtype=np.int64)))
+
+
+def _diff_tokens(table, lengths, tokens_a, tokens_b, offset_a, offset_b, segments, max_edits, preview, max_unfold,
+                 depth):
+    lengths = _token_lengths(table, lengths)
+    starts_a = offset_a + np.concatenate(([0], np.cumsum(lengths[tokens_a])))
+    starts_b = offset_b + np.concatenate(([0], np.cumsum(lengths[tokens_b])))
+
+    opcodes, truncated = align_tokens(tokens_a, tokens_b, max_edits)
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            continue
+        part_a, part_b = tokens_a[i1:i2], tokens_b[j1:j2]
+        kind = 'replace'
+        if i1 == i2:
+            kind = 'insert'
+        elif j1 == j2:
+            kind = 'delete'
+        elif (part_a.size == 1 and part_b.size == 1 and table.is_loop(int(part_a[0])) and table.is_loop(int(part_b[0]))
+              and table.entries[int(part_a[0])][0] == table.entries[int(part_b[0])][0]):
+            # Same loop body, different trip count: a repeat change, not new code
+            kind = 'repeat'
+
+        if kind == 'replace':
+            # Loops over the same body at either end share their common iterations
+            split = _split_common_loops(table, part_a, part_b)
+            if split is not None:
+                truncated |= _diff_tokens(table, lengths, split[0], split[1], int(starts_a[i1]), int(starts_b[j1]),
+                                          segments, max_edits=max_edits, preview=preview, max_unfold=max_unfold,
+                                          depth=depth)
+                continue
+
+        if kind == 'replace' and depth > 0:
+            # The loops folded differently on each side; unfold one level to find
+            # where inside them the runs actually part ways
+            unfolded_a = _unfold(table, part_a, max_unfold)
+            unfolded_b = _unfold(table, part_b, max_unfold)
+            if unfolded_a is not None and unfolded_b is not None and (
+                    unfolded_a.size != part_a.size or unfolded_b.size != part_b.size):
+                truncated |= _diff_tokens(table, lengths, unfolded_a, unfolded_b, int(starts_a[i1]), int(starts_b[j1]),
+                                          segments, max_edits=max_edits, preview=preview, max_unfold=max_unfold,
+                                          depth=depth - 1)
+                continue
+
+        segments.append({
+            "kind": kind,
+            "a": [int(starts_a[i1]), int(starts_a[i2])],
+            "b": [int(starts_b[j1]), int(starts_b[j2])],
+            "a_lines": _preview(table, part_a, preview),
+            "b_lines": _preview(table, part_b, preview),
+        })
+    return truncated
+
+
+def _split_common_loops(table, part_a, part_b):
+    """Splits loop(body, n) and loop(body, m) at the same end of both parts into
+    loop(body, min(n, m)) plus what is left, so the common iterations align as one
+    equal token. Returns the two new token arrays, or None when neither end matches.
+    """
+    a, b = part_a.tolist(), part_b.tolist()
+    for end in (0, -1):
+        children_a, count_a, _ = table.entries[a[end]]
+        children_b, count_b, _ = table.entries[b[end]]
+        if not children_a or children_a != children_b:
+            continue
+        common = table.loop(children_a, min(count_a, count_b))
+        rest_a, rest_b = (_repeat(table, children_a, count - min(count_a, count_b)) for count in (count_a, count_b))
+        if end == 0:
+            a, b = [common] + rest_a + a[1:], [common] + rest_b + b[1:]
+        else:
+            a, b = a[:-1] + rest_a + [common], b[:-1] + rest_b + [common]
+        return np.array(a, dtype=np.int64), np.array(b, dtype=np.int64)
+    return None
+
+
+def _repeat(table, children, count):
+    # A single iteration stays as its body, so the alignment can look inside it
+    return [table.loop(children, count)] if count > 1 else list(children) * count
+
+
+def _unfold(table, tokens, limit):
+    out = []
+    for token in tokens.tolist():
+        children, count, _ = table.entries[token]
+        if children:
+            out.extend(children * count)
+        else:
+            out.append(token)
+        if len(out) > limit:
+            return None
+    return np.array(out, dtype=np.int64)
+
+
+def _preview(table, tokens, limit):
+    lines = []
+    for token in tokens.tolist():
+        if len(lines) >= limit:
+            break
+        lines.extend(table.expand(token, limit - len(lines)))
+    return lines
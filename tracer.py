@@ -0,0 +1,583 @@
+import asyncio
+import contextlib
+import dis
+import inspect
+import io
+import itertools
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from array import array
+import numpy as np
+
+# Per-thread cap on recorded line events, so runaway loops can't exhaust memory
+MAX_TRACE_STEPS = 1_000_000
+# Opcode mode: per-thread cap on recorded instructions (8 bytes each)
+MAX_OPCODE_STEPS = 2_000_000
+# Each instruction is packed as code object index << 48 | line << 24 | offset
+OPCODE_FIELD_BITS = 24
+YIELD_VALUE = dis.opmap['YIELD_VALUE']
+# Task lifecycle events recorded in asyncio mode
+TASK_EVENTS = ('created', 'resumed', 'suspended', 'done')
+TASK_CREATED, TASK_RESUMED, TASK_SUSPENDED, TASK_DONE = range(len(TASK_EVENTS))
+# Function entry and exit events recorded in call mode
+CALL_EVENTS = ('call', 'return')
+CALL, RETURN = range(len(CALL_EVENTS))
+# Memory mode runs the script under tracemalloc. Overhead bound: each line event costs
+# roughly 20x the plain tracer (about 12us instead of 0.6us here), and the run is still
+# capped by the trace timeout and MAX_TRACE_STEPS; tracemalloc's own bookkeeping is
+# capped by MEMORY_OVERHEAD_LIMIT, past which the profile stops and is marked truncated.
+# Allocations are charged to the innermost script frame among the newest MEMORY_FRAMES,
+# so a library call that allocates deeper than that only shows up in the peaks.
+MEMORY_FRAMES = 4
+MEMORY_OVERHEAD_LIMIT = 64 << 20
+MEMORY_CHECK_INTERVAL = 1024
+
+# --- Trace Dispatch ---
+# One hook serves every active tracer: each run compiles its script under a unique
+# filename, so a frame's filename says which tracer (if any) it belongs to.
+_active_tracers = {}
+_active_lock = threading.Lock()
+_run_ids = itertools.count(1)
+_thread_start = threading.Thread.start
+_saved_policy = None
+# Memory-mode runs sharing tracemalloc, and whether we started it for them
+_memory_users = 0
+_memory_started = False
+
+
+def _dispatch(frame, event, arg):
+    tracer = _active_tracers.get(frame.f_code.co_filename)
+    if tracer is None:
+        # Library and server code, event-loop internals included, is never traced
+        return None
+    return tracer.global_trace(frame, event, arg)
+
+
+def _start_thread(thread):
+    """Thread.start while anything is traced: threads started from traced code get the hook."""
+    # Only a traced thread (the script's, or one it started) has the hook installed
+    if sys.gettrace() is _dispatch:
+        run = thread.run
+
+        def traced_run():
+            sys.settrace(_dispatch)
+            run()
+        thread.run = traced_run
+    _thread_start(thread)
+
+
+def _activate(tracer):
+    global _saved_policy, _memory_users, _memory_started
+    with _active_lock:
+        if tracer.memory:
+            if not _memory_users and not tracemalloc.is_tracing():
+                tracemalloc.start(MEMORY_FRAMES)
+                _memory_started = True
+            _memory_users += 1
+            tracer.memory_active = True
+        if tracer.async_tasks and not any(t.async_tasks for t in _active_tracers.values()):
+            _saved_policy = asyncio.get_event_loop_policy()
+            asyncio.set_event_loop_policy(_TaskTracingPolicy())
+        _active_tracers[tracer.filename] = tracer
+        # Rather than threading.settrace, which would hook every thread the server starts
+        threading.Thread.start = _start_thread
+
+
+def _release_memory(tracer):
+    global _memory_users, _memory_started
+    with _active_lock:
+        if not tracer.memory_active:
+            return
+        tracer.memory_active = False
+        _memory_users -= 1
+        # tracemalloc that was already running before any trace needed it stays on
+        if not _memory_users and _memory_started:
+            tracemalloc.stop()
+            _memory_started = False
+
+
+def _deactivate(tracer):
+    with _active_lock:
+        if _active_tracers.pop(tracer.filename, None) is None:
+            return
+        if tracer.async_tasks and not any(t.async_tasks for t in _active_tracers.values()):
+            asyncio.set_event_loop_policy(_saved_policy)
+        if not _active_tracers:
+            threading.Thread.start = _thread_start
+
+
+# --- Asyncio Task Tracking ---
+class _TaskTracingPolicy(asyncio.DefaultEventLoopPolicy):
+    """Gives every new event loop a task factory that reports to the active tracers."""
+
+    def new_event_loop(self):
+        loop = super().new_event_loop()
+        loop.set_task_factory(_task_factory)
+        return loop
+
+
+def _task_factory(loop, coro, **kwargs):
+    task = asyncio.Task(coro, loop=loop, **kwargs)
+    code = getattr(coro, 'cr_code', None)
+    tracer = _active_tracers.get(code.co_filename) if code else None
+    if tracer is not None and tracer.async_tasks and not tracer.stopped:
+        tracer.task_index(task)
+    return task
+
+
+def _current_task():
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        # A coroutine driven by hand, outside any running loop
+        return None
+
+
+# --- Execution Tracing (from HoloDeck5.py) ---
+class TraceResult:
+    """Line events of every traced thread, merged into one timeline by timestamp.
+
+    `lines[i]` ran on thread `threads[step_threads[i]]` at `timestamps[i]`
+    nanoseconds after the run started. In asyncio mode `step_tasks[i]` is the task
+    it ran in (-1 for none) and `task_events` holds (timestamp, task, event) rows.
+    """
+
+    def __init__(self, lines, step_threads, timestamps, threads, duration,
+                 step_tasks=None, tasks=(), task_events=None, memory=None, opcodes=None, calls=None):
+        self.lines = lines
+        self.step_threads = step_threads
+        self.timestamps = timestamps
+        self.threads = threads
+        # Nanoseconds from the start of the run until tracing stopped
+        self.duration = duration
+        self.step_tasks = step_tasks
+        self.tasks = list(tasks)
+        self.task_events = task_events
+        # {"net": {line: bytes}, "peak": {line: bytes}, "truncated": bool} in memory mode
+        self.memory = memory
+        # {"events": code << 48 | line << 24 | offset per instruction, "codes": code objects
+        # by index, "truncated": bool} in opcode mode
+        self.opcodes = opcodes
+        # {"events": (timestamp, thread, function, event) rows, "functions": [...]} in call mode
+        self.calls = calls
+        # "Type: message" of the exception that ended the script, if one did
+        self.error = None
+
+    def step_groups(self):
+        """One id per (thread, task) each step ran in; None when all steps share one."""
+        if self.step_tasks is None:
+            return self.step_threads if len(self.threads) > 1 else None
+        return self.step_threads * (len(self.tasks) + 1) + self.step_tasks + 1
+
+    def split_groups(self, groups):
+        """Inverse of step_groups: returns the (thread, task) index arrays."""
+        if self.step_tasks is None:
+            return groups, None
+        threads, tasks = np.divmod(groups, len(self.tasks) + 1)
+        return threads, tasks - 1
+
+    def task_timelines(self):
+        """Per-task lifecycle: creation, finish and the spans it spent running."""
+        timelines = [dict(task, created=None, finished=None, spans=[]) for task in self.tasks]
+        running = {}
+        for timestamp, task, event in self.task_events.tolist():
+            timeline = timelines[task]
+            if event == TASK_CREATED:
+                timeline["created"] = timestamp
+            elif event == TASK_RESUMED:
+                running[task] = timestamp
+            else:
+                if task in running:
+                    timeline["spans"].append([running.pop(task), timestamp])
+                if event == TASK_DONE:
+                    timeline["finished"] = timestamp
+        # Tasks still running when the trace stopped
+        for task, started in running.items():
+            timelines[task]["spans"].append([started, self.duration])
+        return timelines
+
+
+class ExecutionTracer:
+    def __init__(self, code, max_steps=MAX_TRACE_STEPS, async_tasks=False, memory=False,
+                 opcodes=False, max_opcodes=MAX_OPCODE_STEPS, calls=False, replay=None):
+        self.code = code
+        # A replay.ReplayLog that supplies the script's random, time and stdin
+        self.replay = replay
+        self.filename = f'<holodeck-{next(_run_ids)}>'
+        self.max_steps = max_steps
+        self.async_tasks = async_tasks
+        self.memory = memory
+        self.memory_active = False
+        self.memory_truncated = False
+        self.snapshot = None
+        # Per-thread {line: peak bytes} dicts filled by the memory sampler
+        self.peaks = []
+        self.opcodes = opcodes
+        self.max_opcodes = max_opcodes
+        self.opcodes_truncated = False
+        # Per-thread instruction buffers filled by the opcode recorder
+        self.opcode_buffers = []
+        self.calls = calls
+        # {"name", "line"} and the code object per function seen in call or opcode mode,
+        # indexed by function_ids[code]
+        self.functions = []
+        self.codes = []
+        self.function_ids = {}
+        self._functions_lock = threading.Lock()
+        self.stopped = False
+        self.started_ns = 0
+        self.stopped_ns = 0
+        self.error = None
+        # (thread id, thread name, line buffer, task event buffer, call buffer) per thread
+        self.buffers = []
+        self.tasks = []
+        self.task_ids = {}
+        self._thread_state = threading.local()
+
+    def global_trace(self, frame, event, arg):
+        if self.stopped:
+            return None
+        state = self._state()
+        if self.calls and len(state.calls) < 3 * self.max_steps:
+            # Only 'call' events reach the global trace function
+            state.calls.extend((time.perf_counter_ns(), self.function_index(frame.f_code), CALL))
+        if self.opcodes and not self.opcodes_truncated:
+            frame.f_trace_opcodes = True
+        if self.async_tasks and frame.f_code.co_flags & inspect.CO_COROUTINE:
+            # Entering a coroutine frame is a task starting or resuming after an await
+            task = _current_task()
+            if task is not None:
+                index = self.task_index(task)
+                if index != state.task[0]:
+                    self._record_task(state, index, TASK_RESUMED)
+                    state.task[0] = index
+        return state.trace_line
+
+    def _state(self):
+        state = self._thread_state
+        if not hasattr(state, 'trace_line'):
+            # Each thread appends to its own buffers, so recording needs no lock
+            thread = threading.current_thread()
+            state.lines = array('q')
+            state.task_events = array('q')
+            state.calls = array('q')
+            state.task = [-1]
+            self.buffers.append((thread.ident, thread.name, state.lines, state.task_events, state.calls))
+            state.trace_line = self._task_tracer(state) if self.async_tasks else self._line_tracer(state)
+            if self.memory:
+                state.trace_line = self._memory_sampler(state)
+            if self.opcodes:
+                state.trace_line = self._opcode_recorder(state)
+            if self.calls:
+                state.trace_line = self._return_recorder(state)
+        return state
+
+    def _line_tracer(self, state):
+        lines = state.lines
+        append = lines.append
+        clock = time.perf_counter_ns
+        limit = 2 * self.max_steps
+
+        def trace_line(frame, event, arg):
+            # We only care about the 'line' event
+            if event == 'line':
+                if self.stopped or len(lines) >= limit:
+                    return None
+                append(clock())
+                append(frame.f_lineno)
+            return trace_line
+        return trace_line
+
+    def _task_tracer(self, state):
+        lines = state.lines
+        append = lines.append
+        task = state.task
+        clock = time.perf_counter_ns
+        limit = 3 * self.max_steps
+
+        def trace_task_line(frame, event, arg):
+            if event == 'line':
+                if self.stopped or len(lines) >= limit:
+                    return None
+                append(clock())
+                append(frame.f_lineno)
+                append(task[0])
+            elif event == 'return' and task[0] >= 0 and frame.f_code.co_flags & inspect.CO_COROUTINE \
+                    and frame.f_lasti >= 0 and frame.f_code.co_code[frame.f_lasti] == YIELD_VALUE:
+                # Returning at a yield means the task awaited something not yet done
+                self._record_task(state, task[0], TASK_SUSPENDED)
+                task[0] = -1
+            return trace_task_line
+        return trace_task_line
+
+    def _memory_sampler(self, state):
+        """Wraps a line tracer to charge each line the allocation peak reached before the next one.
+
+        tracemalloc's peak is process-wide, so lines of concurrently running threads
+        may be charged each other's allocations.
+        """
+        trace_line = state.trace_line
+        buffer_size = state.lines.__sizeof__
+        peaks = {}
+        self.peaks.append(peaks)
+        get_traced_memory = tracemalloc.get_traced_memory
+        reset_peak = tracemalloc.reset_peak
+        # Previous line, memory in use when it started, lines until the next overhead check
+        previous = [-1, 0, MEMORY_CHECK_INTERVAL]
+
+        def trace_memory(frame, event, arg):
+            if event != 'line' or not self.memory_active:
+                return trace_memory if trace_line(frame, event, arg) is not None else None
+            current, peak = get_traced_memory()
+            line = previous[0]
+            if line >= 0 and peak - previous[1] > peaks.get(line, 0):
+                peaks[line] = peak - previous[1]
+            size = buffer_size()
+            traced = trace_line(frame, event, arg)
+            if buffer_size() != size:
+                # Our own buffer grew; start the next line after its growth
+                current = get_traced_memory()[0]
+            reset_peak()
+            previous[0], previous[1] = frame.f_lineno, current
+            previous[2] -= 1
+            if not previous[2]:
+                previous[2] = MEMORY_CHECK_INTERVAL
+                if tracemalloc.get_tracemalloc_memory() > MEMORY_OVERHEAD_LIMIT:
+                    self.memory_truncated = True
+                    self._take_snapshot()
+            return trace_memory if traced is not None else None
+        return trace_memory
+
+    def _opcode_recorder(self, state):
+        """Wraps a line tracer to also record each executed instruction.
+
+        The code object is part of each event, since a comprehension or nested
+        function shares line numbers and offsets with the code around it.
+        """
+        trace_line = state.trace_line
+        function_ids = self.function_ids
+        instructions = array('q')
+        self.opcode_buffers.append(instructions)
+        append = instructions.append
+        limit = self.max_opcodes
+
+        def trace_opcode(frame, event, arg):
+            if event != 'opcode':
+                return trace_opcode if trace_line(frame, event, arg) is not None else None
+            if self.stopped:
+                return None
+            if len(instructions) < limit:
+                code = frame.f_code
+                index = function_ids.get(code)
+                if index is None:
+                    index = self.function_index(code)
+                append(index << 2 * OPCODE_FIELD_BITS | (frame.f_lineno or 0) << OPCODE_FIELD_BITS | frame.f_lasti)
+            else:
+                # Out of budget: stop opcode events here; new frames no longer turn them on
+                self.opcodes_truncated = True
+                frame.f_trace_opcodes = False
+            return trace_opcode
+        return trace_opcode
+
+    def _return_recorder(self, state):
+        """Wraps a line tracer to also record each return from a traced frame.
+
+        A frame whose tracer gave up (out of budget or stopped) records no return;
+        exporters close such frames at the end of the trace.
+        """
+        trace_line = state.trace_line
+        extend = state.calls.extend
+        calls = state.calls
+        clock = time.perf_counter_ns
+        limit = 3 * self.max_steps
+
+        def trace_return(frame, event, arg):
+            traced = trace_line(frame, event, arg)
+            if event == 'return' and not self.stopped and len(calls) < limit:
+                extend((clock(), self.function_index(frame.f_code), RETURN))
+            return trace_return if traced is not None else None
+        return trace_return
+
+    def function_index(self, code):
+        index = self.function_ids.get(code)
+        if index is None:
+            with self._functions_lock:
+                index = self.function_ids.setdefault(code, len(self.functions))
+                if index == len(self.functions):
+                    self.functions.append({"name": code.co_qualname, "line": code.co_firstlineno})
+                    self.codes.append(code)
+        return index
+
+    def _take_snapshot(self):
+        # Only the script's own allocations, wherever in the kept stack its frame is
+        if self.memory_active and self.snapshot is None:
+            self.snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(True, self.filename, all_frames=True),
+                # The tracer's own buffers grow while a script frame is on the stack
+                tracemalloc.Filter(False, __file__),
+            ])
+        _release_memory(self)
+
+    def memory_profile(self):
+        """Net bytes still allocated at the end and peak bytes per script line."""
+        net = {}
+        if self.snapshot is not None:
+            for stat in self.snapshot.statistics('traceback'):
+                # Charge the innermost script frame; the traceback runs oldest first
+                line = next(frame.lineno for frame in reversed(stat.traceback) if frame.filename == self.filename)
+                net[line] = net.get(line, 0) + stat.size
+        peak = {}
+        for peaks in list(self.peaks):
+            for line, size in list(peaks.items()):
+                peak[line] = max(peak.get(line, 0), size)
+        return {"net": net, "peak": peak, "truncated": self.memory_truncated}
+
+    def task_index(self, task):
+        index = self.task_ids.get(task)
+        if index is None:
+            state = self._state()
+            index = self.task_ids[task] = len(self.tasks)
+            self.tasks.append((task, state.task[0]))
+            self._record_task(state, index, TASK_CREATED)
+            task.add_done_callback(lambda _: self._task_done(index))
+        return index
+
+    def _task_done(self, index):
+        state = self._state()
+        self._record_task(state, index, TASK_DONE)
+        if state.task[0] == index:
+            state.task[0] = -1
+
+    def _record_task(self, state, index, event):
+        state.task_events.extend((time.perf_counter_ns(), index, event))
+
+    def run_code(self):
+        _activate(self)
+        # Set the trace function for the current thread
+        sys.settrace(_dispatch)
+        self.started_ns = time.perf_counter_ns()
+        namespace = {"__name__": "__main__"}
+        if self.replay is not None:
+            namespace["__builtins__"] = self.replay.script_builtins()
+        try:
+            # Execute the user's code in a restricted scope
+            exec(compile(self.code, self.filename, 'exec'), namespace)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"Error during traced execution: {e}")
+        finally:
+            # Always remove the trace function
+            sys.settrace(None)
+            if self.memory:
+                # Taken while the script's globals are alive, so they count as net allocations
+                self._take_snapshot()
+
+    def stop(self):
+        self.stopped = True
+        self.stopped_ns = time.perf_counter_ns()
+        _deactivate(self)
+        if self.memory:
+            # A script cut off by the timeout is measured as far as it got
+            self._take_snapshot()
+
+    def result(self):
+        """Merges the per-thread buffers into one timeline ordered by timestamp."""
+        columns = 3 if self.async_tasks else 2
+        # Threads that outlived the timeout may still append, so every buffer is read from a copy
+        buffers = [(ident, name, _rows(lines, columns), _rows(task_events, 3), _rows(calls, 3))
+                   for ident, name, lines, task_events, calls in list(self.buffers)]
+        threads = [{"id": ident, "name": name} for ident, name, _, _, _ in buffers]
+        events = np.concatenate([rows for _, _, rows, _, _ in buffers] or [np.empty((0, columns), dtype=np.int64)])
+        step_threads = np.repeat(np.arange(len(buffers)), [len(rows) for _, _, rows, _, _ in buffers])
+        order = np.argsort(events[:, 0], kind='stable')
+        events, step_threads = events[order], step_threads[order]
+        timestamps = events[:, 0] - self.started_ns
+        duration = self.stopped_ns - self.started_ns
+        memory = self.memory_profile() if self.memory else None
+        opcodes = None
+        if self.opcodes:
+            instructions = [np.frombuffer(buffer[:], dtype=np.int64) for buffer in list(self.opcode_buffers)]
+            opcodes = {"events": np.concatenate(instructions or [np.empty(0, dtype=np.int64)]),
+                       "codes": list(self.codes), "truncated": self.opcodes_truncated}
+        calls = None
+        if self.calls:
+            # Rows of (timestamp, thread, function, event); each thread's rows are already in order
+            rows = [np.insert(rows, 1, thread, axis=1) for thread, (_, _, _, _, rows) in enumerate(buffers)]
+            rows = np.concatenate(rows or [np.empty((0, 4), dtype=np.int64)])
+            rows = rows[np.argsort(rows[:, 0], kind='stable')]
+            rows[:, 0] -= self.started_ns
+            calls = {"events": rows, "functions": list(self.functions)}
+        if not self.async_tasks:
+            return TraceResult(events[:, 1], step_threads, timestamps, threads, duration,
+                               memory=memory, opcodes=opcodes, calls=calls)
+
+        task_events = np.concatenate([rows for _, _, _, rows, _ in buffers] or [np.empty((0, 3), dtype=np.int64)])
+        task_events = task_events[np.argsort(task_events[:, 0], kind='stable')]
+        task_events[:, 0] -= self.started_ns
+        # Names are read last: create_task(name=...) renames a task after the factory ran
+        tasks = [{"id": index, "name": task.get_name(), "parent": parent}
+                 for index, (task, parent) in enumerate(list(self.tasks))]
+        return TraceResult(events[:, 1], step_threads, timestamps, threads, duration,
+                           events[:, 2], tasks, task_events, memory, opcodes, calls)
+
+
+def _rows(buffer, columns):
+    # Slicing copies the array in one step; a numpy view of the live buffer would make
+    # a runaway thread's next append raise BufferError
+    values = np.frombuffer(buffer[:], dtype=np.int64)
+    return values[:len(values) // columns * columns].reshape(-1, columns)
+
+
+def run_trace_detailed(code, timeout=5, async_tasks=False, memory=False, opcodes=False, calls=False,
+                       replay=None, max_steps=MAX_TRACE_STEPS):
+    tracer = ExecutionTracer(code, max_steps, async_tasks=async_tasks, memory=memory, opcodes=opcodes,
+                             calls=calls, replay=replay)
+    # Running the trace in a separate thread to avoid blocking
+    trace_thread = threading.Thread(target=tracer.run_code, daemon=True)
+    trace_thread.start()
+    trace_thread.join(timeout=timeout) # Add a timeout to prevent hangs from infinite loops
+    tracer.stop()
+    result = tracer.result()
+    result.error = tracer.error
+    return result
+
+
+def run_trace(code, timeout=5):
+    return run_trace_detailed(code, timeout).lines.tolist()
+
+
+# --- Runs With Inputs ---
+# Keep only the end of what a run printed
+MAX_RUN_OUTPUT = 4000
+
+def trace_input(code, run_input, timeout=5):
+    """Traces one run of a script with the given argv, stdin and random seed.
+
+    Meant for a worker process of its own, since the inputs are installed by
+    replacing sys.argv, sys.stdin and the random module's state. Returns line hit
+    counts and (line, next line) transition counts rather than the whole trace.
+    """
+    started = time.perf_counter()
+    sys.argv = ['<script>'] + run_input['argv']
+    sys.stdin = io.StringIO(run_input['stdin'])
+    random.seed(run_input['seed'])
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = run_trace_detailed(code, timeout)
+
+    lines = result.lines
+    line_ids, hits = np.unique(lines, return_counts=True)
+    # Consecutive steps on different threads or tasks are not transitions
+    groups = result.step_groups()
+    same = groups[1:] == groups[:-1] if groups is not None else np.ones(max(len(lines) - 1, 0), dtype=bool)
+    pairs = np.stack([lines[:-1][same], lines[1:][same]], axis=1)
+    pairs, pair_counts = np.unique(pairs, axis=0, return_counts=True)
+    return {
+        "lines": line_ids, "hits": hits, "pairs": pairs, "pair_counts": pair_counts,
+        "steps": len(lines), "error": result.error,
+        "output": output.getvalue()[-MAX_RUN_OUTPUT:],
+        "seconds": round(time.perf_counter() - started, 3),
+    }
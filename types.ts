@@ -4,20 +4,173 @@ export interface GraphNode {
   code: string;
   position: [number, number, number];
   type?: string; 
+  lines?: [number, number][]; // Line ranges covered by a basic block in 'cfg' mode
 }
 
 export interface GraphEdge {
   source: number;
   target: number;
+  kind?: 'flow' | 'branch' | 'loop' | 'exception' | 'jump' | 'def';
+}
+
+export interface WeightedEdge extends GraphEdge {
+  weight: number;
+  runtime_only: boolean;
 }
 
 export interface GraphData {
   nodes: GraphNode[];
   edges: GraphEdge[];
+  weighted_edges?: WeightedEdge[];
 }
 
 export type ExecutionTrace = number[];
 
+// One traced thread of a multi-threaded script; its trace holds node ids like ExecutionTrace
+export interface ThreadTrace {
+  id: number;
+  name: string;
+  trace?: ExecutionTrace; // Left out under a playback summary
+}
+
+// One asyncio task of a script traced with `async_tasks`; times are microseconds from the start
+export interface TaskTimeline {
+  id: number;
+  name: string;
+  parent: number; // Task that created it, -1 for none
+  created: number | null;
+  finished: number | null;
+  spans: [number, number][]; // When it was running, between resuming and suspending at an await
+  trace?: ExecutionTrace; // Left out under a playback summary
+}
+
+// Per-node allocation profile from a trace run with `memory`, aligned with GraphData.nodes
+export interface MemoryProfile {
+  net: number[]; // Bytes still allocated by the node's lines when the script ended
+  peak: number[]; // Largest allocation peak during one execution of any of its lines
+  truncated: boolean; // Profiling hit its overhead limit before the script finished
+}
+
+// Bytecode instructions executed per node from a trace run with `opcodes`, aligned with GraphData.nodes
+export interface InstructionProfile {
+  counts: number[];
+  // Most executed instructions; `function` is the qualified name of the code object they ran in
+  hot: { line: number; offset: number; function: string; op: string | null; count: number }[];
+  total: number;
+  truncated: boolean; // The instruction budget ran out before the script finished
+}
+
+export type PlaybackKind = 'step' | 'branch' | 'loop_entry' | 'loop' | 'loop_exit';
+
+// A long trace summarized with the `frames` option; frame i plays nodes[i] and
+// stands for raw steps starts[i] up to ends[i], which /api/trace_slice returns
+export interface PlaybackSummary {
+  nodes: ExecutionTrace;
+  starts: number[];
+  ends: number[];
+  kinds: number[]; // Indexes into kind_names
+  repeats: number[]; // Loop iterations a 'loop' frame stands for, otherwise 1
+  kind_names: PlaybackKind[];
+  length: number; // Steps in the raw trace
+}
+
+// Raw steps [start, end) of a summarized trace, from /api/trace_slice
+export interface TraceSlice {
+  start: number;
+  end: number;
+  length: number;
+  trace: ExecutionTrace;
+  line_trace?: number[];
+  trace_threads?: number[];
+  trace_tasks?: number[];
+}
+
+// Body of /api/generate_graph; the optional parts depend on the request's options
+export interface GraphResponse {
+  graph: GraphData;
+  trace: ExecutionTrace;
+  threads?: ThreadTrace[];
+  traceThreads?: number[];
+  tasks?: TaskTimeline[];
+  traceTasks?: number[];
+  memory?: MemoryProfile;
+  opcodes?: InstructionProfile;
+  playback?: PlaybackSummary; // When present, trace holds one node per frame
+}
+
+// One run of a coverage request; every field is optional
+export interface CoverageInput {
+  argv?: string[];
+  stdin?: string;
+  seed?: number;
+}
+
+// Body of /api/coverage: per-node arrays line up with graph.nodes
+export interface CoverageResponse {
+  graph: GraphData & { weighted_edges: (WeightedEdge & { runs: number })[] };
+  coverage: {
+    hits: number[]; // Executions summed over all runs
+    runs_hit: number[]; // How many runs reached the node
+    uncovered_lines: number[]; // Executable lines no run reached
+    executable_lines: number;
+  };
+  runs: { steps: number; error: string | null; output: string; seconds: number }[];
+}
+
+// Viewport for /api/graph_query: a box and/or frustum planes [a, b, c, d], inside where a·p + d >= 0
+export interface GraphQuery {
+  box?: { min: [number, number, number]; max: [number, number, number] };
+  frustum?: [number, number, number, number][];
+  camera?: [number, number, number];
+  lod_distance?: number; // Visible nodes further from the camera come back as clusters
+}
+
+export interface GraphQueryResponse {
+  nodes: GraphNode[];
+  edges: GraphEdge[];
+  anchors: { id: number; position: [number, number, number] }[]; // Far ends of edges leaving `nodes`
+  clusters: { position: [number, number, number]; count: number; radius: number }[];
+  total_nodes: number;
+  visible_nodes: number;
+}
+
+// What /api/record logged of a run's random seed, clock readings and stdin; opaque to the client
+export interface ReplayLog {
+  version: number;
+  seed: number;
+  time: Record<string, number[]>;
+  stdin: string;
+  steps: number;
+  seconds: number;
+  truncated: boolean; // More clock readings than the log keeps; a replay may diverge past them
+}
+
+// Steps [start, end) regenerated by /api/replay; `diverged` means they may differ from the recording
+export interface ReplayWindow {
+  trace: ExecutionTrace;
+  start: number;
+  end: number;
+  length: number;
+  diverged: boolean;
+  error: string | null;
+}
+
 export type ExecutionStatus = 'idle' | 'loading' | 'ready' | 'tracing' | 'finished' | 'error';
 
 export type CameraMode = 'orbit' | 'static' | 'fly' | 'observe';
+
+export interface GraphDelta {
+  version: number;
+  nodes: {
+    added: GraphNode[];
+    removed: number[];
+    changed: { id: number; code: string; type?: string }[];
+  };
+  edges: {
+    added: GraphEdge[];
+    removed: GraphEdge[];
+  };
+  positions: Record<string, [number, number, number]>;
+  // Applied first, in order: ids >= from move by `by`; a negative `by` drops ids from + by .. from - 1
+  shifts: { from: number; by: number }[];
+}
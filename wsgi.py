@@ -0,0 +1,9 @@
+"""Production entry point: `gunicorn -c gunicorn.conf.py wsgi:app`.
+
+Importing this module preloads the analysis modules, so with gunicorn's
+preload_app the master process pays for them once and every forked worker
+shares them copy-on-write.
+"""
+from server import app, preload
+
+preload()